@@ -6,8 +6,8 @@ from ipmininet.cli import IPCLI
 from ipmininet import DEBUG_FLAG
 from ipmininet.srv6 import enable_srv6
 from ipmininet.srv6 import SRv6Encap
-from ipmininet.utils import realIntfList
 from time import sleep
+from srv6_sysctl import enable_seg6
 
 class MyTopology(IPTopo):
 
@@ -40,16 +40,7 @@ class MyTopology(IPTopo):
         return r
     
     def post_build(self, net):
-        for n in net.hosts + net.routers:
-            
-            result = n.cmd("sysctl net.vrf.strict_mode = 1")
-            result = n.cmd("sysctl net.ipv4.conf.all.rp_filter = 0")
-            result = n.cmd("sysctl net.ipv6.seg6_flowlabel = 1")
-            
-            n.cmd("sysctl net.ipv6.conf.all.seg6_enabled=1")
-            n.cmd("sysctl net.ipv6.conf.default.seg6_enabled=1")
-            for intf in realIntfList(n):
-                n.cmd("sysctl net.ipv6.conf.%s.seg6_enabled=1" % intf.name)
+        enable_seg6(net)
 
         for r in net.routers:
             r.cmd("python3 lookup_bgp_table.py &")
@@ -6,6 +6,7 @@ from itertools import chain
 import subprocess
 from ipaddress import ip_interface, IPv4Interface, IPv6Interface
 import functools
+import json
 from typing import Union, Tuple, Optional, Generator, Sequence, List, Type
 
 from . import OSPF_DEFAULT_AREA, MIN_IGP_METRIC
@@ -293,6 +294,24 @@ def _parse_addresses(out: str) -> Tuple[Optional[str], List[IPv4Interface],
     return mac, v4, v6
 
 
+def _parse_addresses_json(out: str) \
+        -> Tuple[Optional[str], List[IPv4Interface], List[IPv6Interface]]:
+    """Parse the output of an ip -j address command
+    :return: mac, [ipv4], [ipv6]"""
+    mac = None
+    v4 = []
+    v6 = []
+    for link in json.loads(out):
+        mac = link.get('address', mac)
+        for addr in link.get('addr_info', ()):
+            prefix = '%s/%s' % (addr['local'], addr['prefixlen'])
+            if addr['family'] == 'inet':
+                v4.append(IPv4Interface(prefix))
+            elif addr['family'] == 'inet6':
+                v6.append(IPv6Interface(prefix))
+    return mac, v4, v6
+
+
 class IPLink(_m.Link):
     """A Link class that defaults to IPIntf"""
     def __init__(self, node1: str, node2: str, intf: Type[IPIntf] = IPIntf,
@@ -317,6 +336,14 @@ class OrderedAddress:
     def __lt__(self, other):
         return address_comparator(self.addr, other.addr) < 0
 
+    def sort_key(self) -> tuple:
+        """Return a key ordering addresses as address_comparator does,
+        so that they can be compared without calling it"""
+        a = self.addr
+        return (a.version, not a.network.is_loopback, not a.is_link_local,
+                a.network.is_global, a.network.network_address,
+                a.network.netmask, a.ip)
+
 
 def address_comparator(a, b):
     """Return -1, 0, 1 if a is less, equally, more visible than b.
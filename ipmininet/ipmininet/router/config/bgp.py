@@ -460,6 +460,11 @@ class BGP(QuaggaDaemon, AbstractBGP):
     NAME = 'bgpd'
     DEPENDS = (Zebra,)
     KILL_PATTERNS = (NAME,)
+    # Timers in seconds, None keeps the FRRouting default
+    KEEPALIVE = None
+    HOLDTIME = None
+    CONNECT_RETRY = None
+    ADVERTISEMENT_INTERVAL = None
 
     @property
     def STARTUP_LINE_EXTRA(self):
@@ -483,6 +488,10 @@ class BGP(QuaggaDaemon, AbstractBGP):
         cfg.prefix_lists = self.build_prefix_list()
         cfg.route_maps = self.build_route_map(cfg.neighbors)
         cfg.rr = self._node.get('bgp_rr_info')
+        cfg.keepalive = self.options.keepalive
+        cfg.holdtime = self.options.holdtime
+        cfg.connect_retry = self.options.connect_retry
+        cfg.advertisement_interval = self.options.advertisement_interval
 
         return cfg
 
@@ -548,7 +557,18 @@ class BGP(QuaggaDaemon, AbstractBGP):
 
     def set_defaults(self, defaults):
         """:param debug: the set of debug events that should be logged
-        :param address_families: The set of AddressFamily to use"""
+        :param address_families: The set of AddressFamily to use
+        :param keepalive: The keepalive timer of the BGP sessions
+        :param holdtime: The holdtime of the BGP sessions, only used
+                         together with keepalive
+        :param connect_retry: The delay between two connection attempts
+                              to a neighbor
+        :param advertisement_interval: The minimum interval between two
+                                       updates sent to a neighbor"""
+        defaults.keepalive = self.KEEPALIVE
+        defaults.holdtime = self.HOLDTIME
+        defaults.connect_retry = self.CONNECT_RETRY
+        defaults.advertisement_interval = self.ADVERTISEMENT_INTERVAL
         super().set_defaults(defaults)
 
     @classmethod
@@ -12,6 +12,9 @@ debug bgp ${section}
 router bgp ${node.bgpd.asn}
     bgp router-id ${node.bgpd.routerid}
     bgp bestpath compare-routerid
+% if node.bgpd.keepalive is not None and node.bgpd.holdtime is not None:
+    timers bgp ${node.bgpd.keepalive} ${node.bgpd.holdtime}
+% endif
     ! To prevent BGP4 of sending only IPv4 routes
     no bgp default ipv4-unicast
     ! (see https://docs.frrouting.org/en/latest/bgp.html#require-policy-on-ebgp)
@@ -24,6 +27,12 @@ router bgp ${node.bgpd.asn}
     % if n.ebgp_multihop:
     neighbor ${n.peer} ebgp-multihop
     % endif
+    % if node.bgpd.connect_retry is not None:
+    neighbor ${n.peer} timers connect ${node.bgpd.connect_retry}
+    % endif
+    % if node.bgpd.advertisement_interval is not None:
+    neighbor ${n.peer} advertisement-interval ${node.bgpd.advertisement_interval}
+    % endif
     <%block name="neighbor"/>
 % endfor
 % for af in node.bgpd.address_families:
@@ -75,7 +84,7 @@ ${pl.zebra_family} prefix-list ${pl.name} ${e.action} ${e.prefix} ${ 'le %s' % e
 
 
 % for rm in node.bgpd.route_maps:
-    %for order in sorted(rm.entries.keys()):
+    %for order in rm.orders:
 route-map ${rm.name} ${rm.entries[order].match_policy} ${order}
         %for match in rm.entries[order].match_cond:
             %if match.cond_type == "access-list" and match.family == rm.family:
@@ -1,25 +1,32 @@
+import errno
+import itertools
 import os
-import socket
+import sys
+from bisect import bisect_left, insort
 from abc import abstractmethod, ABC
 from ipaddress import IPv4Network, IPv6Network, ip_network
-from typing import Optional, Union, Sequence, Tuple, Set, Dict
+from typing import TYPE_CHECKING, Optional, Union, Sequence, Tuple, Set, \
+    Dict, List
 
 from .base import RouterDaemon
 from .utils import ConfigDict
 
+if TYPE_CHECKING:
+    import socket
+
 #  Route Map actions
 DENY = 'deny'
 PERMIT = 'permit'
 
+# Address family of each IP version
+_FAMILY = {4: 'ipv4', 6: 'ipv6'}
+# Zebra keyword of each address family
+_ZFAM = {'ipv4': 'ip', 'ipv6': 'ipv6', 'community': 'community'}
+
 
 def get_family(prefix: Union[str, IPv4Network, IPv6Network]) -> Optional[str]:
     pfx = ip_network(prefix) if isinstance(prefix, str) else prefix
-    if pfx.version == 4:
-        return 'ipv4'
-    elif pfx.version == 6:
-        return 'ipv6'
-
-    return None
+    return _FAMILY.get(pfx.version)
 
 
 class QuaggaDaemon(RouterDaemon):
@@ -28,20 +35,28 @@ class QuaggaDaemon(RouterDaemon):
     # Additional parameters to pass when starting the daemon
     STARTUP_LINE_EXTRA = ''
 
+    def __init__(self, *args, **kwargs):
+        # These only depend on the node, hence are computed once
+        self._zebra_socket = None  # type: Optional[str]
+        self._dry_run = None  # type: Optional[str]
+        super().__init__(*args, **kwargs)
+
     @property
     def startup_line(self):
-        return '{name} -f {cfg} -i {pid} -z {api} -u root {extra}'\
-                .format(name=self.NAME,
-                        cfg=self.cfg_filename,
-                        pid=self._file('pid'),
-                        api=self.zebra_socket,
-                        extra=self.STARTUP_LINE_EXTRA)
+        if self._startup_line is None:
+            self._startup_line = f'{self.NAME} -f {self.cfg_filename}' \
+                                 f' -i {self._file("pid")}' \
+                                 f' -z {self.zebra_socket} -u root' \
+                                 f' {self.STARTUP_LINE_EXTRA}'
+        return self._startup_line
 
     @property
     def zebra_socket(self):
         """Return the path towards the zebra API socket for the given node"""
-        return os.path.join(self._node.cwd,
-                            '%s_%s.api' % ('quagga', self._node.name))
+        if self._zebra_socket is None:
+            self._zebra_socket = os.path.join(self._node.cwd,
+                                              f'quagga_{self._node.name}.api')
+        return self._zebra_socket
 
     def build(self):
         cfg = super().build()
@@ -55,9 +70,9 @@ class QuaggaDaemon(RouterDaemon):
 
     @property
     def dry_run(self):
-        return '{name} -Cf {cfg} -u root'\
-               .format(name=self.NAME,
-                       cfg=self.cfg_filename)
+        if self._dry_run is None:
+            self._dry_run = f'{self.NAME} -Cf {self.cfg_filename} -u root'
+        return self._dry_run
 
 
 class Zebra(QuaggaDaemon):
@@ -69,15 +84,18 @@ class Zebra(QuaggaDaemon):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.files.append(self.zebra_socket)
+        # Socket used to probe the API socket, and whether the probe succeeded
+        self._probe_sock = None  # type: Optional[socket.socket]
+        self._listening = False
 
     def build(self):
         cfg = super().build()
         # Update with preset defaults
         cfg.update(self.options)
         # Track interfaces
-        cfg.interfaces = (ConfigDict(name=itf.name,
+        cfg.interfaces = [ConfigDict(name=itf.name,
                                      description=itf.describe)
-                          for itf in self._node.intfList())
+                          for itf in self._node.intfList()]
         return cfg
 
     def set_defaults(self, defaults):
@@ -92,22 +110,42 @@ class Zebra(QuaggaDaemon):
     def has_started(self, node_exec=None):
         # We override this such that we wait until we have the API socket
         # and until wa can connect to it
-        return os.path.exists(self.zebra_socket) and self.listening()
+        return self._listening or (os.path.exists(self.zebra_socket)
+                                   and self.listening())
 
     def listening(self) -> bool:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        try:
-            sock.connect(self.zebra_socket)
-            sock.close()
+        if self._listening:
             return True
-        except socket.error:
+        # Only needed once the daemons are started, not to build configs
+        import socket
+        # The same non-blocking socket is reused across failed probes
+        if self._probe_sock is None:
+            self._probe_sock = socket.socket(socket.AF_UNIX,
+                                             socket.SOCK_STREAM
+                                             | socket.SOCK_NONBLOCK)
+        err = self._probe_sock.connect_ex(self.zebra_socket)
+        if err not in (0, errno.EAGAIN, errno.EINPROGRESS):
             return False
+        # Someone is listening, a full backlog (EAGAIN) also proves it
+        self._probe_sock.close()
+        self._probe_sock = None
+        self._listening = True
+        return True
+
+    def cleanup(self):
+        if self._probe_sock is not None:
+            self._probe_sock.close()
+            self._probe_sock = None
+        self._listening = False
+        super().cleanup()
 
 
 class CommunityList:
     """A zebra community-list entry"""
-    # Number of CmL
-    count = 0
+    # Numbers the CmL
+    _counter = itertools.count(1)
+
+    __slots__ = ('name', 'action', 'community', 'family')
 
     def __init__(self, name: Optional[str] = None, action=PERMIT,
                  community: Union[int, str] = 0):
@@ -117,8 +155,8 @@ class CommunityList:
         :param action:
         :param community:
         """
-        CommunityList.count += 1
-        self.name = name if name else 'cml%d' % CommunityList.count
+        number = next(CommunityList._counter)
+        self.name = name if name else f'cml{number}'
         self.action = action
         self.community = community
         self.family = 'community'
@@ -126,8 +164,13 @@ class CommunityList:
     def __eq__(self, other):
         return self.name == other.name and self.action == other.action
 
+    def __hash__(self):
+        return hash((self.name, self.action))
+
 
 class Entry:
+    __slots__ = ('prefix', 'action', 'family', 'zebra_family')
+
     def __init__(self, prefix: Union[str, IPv4Network, IPv6Network],
                  action=PERMIT, family=None):
         """
@@ -143,49 +186,55 @@ class Entry:
             else:
                 _prefix = ip_network(prefix)
                 if family is not None:
-                    assert get_family(_prefix) == family, \
+                    # _prefix is already parsed, look its family up directly
+                    prefix_family = _FAMILY.get(_prefix.version)
+                    assert prefix_family == family, \
                         "prefix family %s != family (%s)" % \
-                        (get_family(_prefix), family)
+                        (prefix_family, family)
         else:
             _prefix = prefix
 
         self.prefix = _prefix
         self.action = action
-        self.family = family if family else get_family(self.prefix)
-
-    @property
-    def zebra_family(self):
-        if self.family == 'ipv4':
-            return 'ip'
-        return 'ipv6'
+        self.family = family if family else _FAMILY.get(_prefix.version)
+        self.zebra_family = _ZFAM[self.family]
 
 
 class AccessListEntry(Entry):
     """A zebra access-list entry"""
 
+    __slots__ = ()
+
     def __init__(self, prefix: Union[str, IPv4Network, IPv6Network], action=PERMIT, family=None):
         super().__init__(prefix, action, family)
 
 
+# Maximal prefix length of each address family
+_TYPE_MASK = {'ipv4': 32, 'ipv6': 128}
+# The prefix matching any route of each address family
+_ANY_PREFIX = {'ipv4': ip_network('0.0.0.0/0'), 'ipv6': ip_network('::/0')}
+
+
 class PrefixListEntry(Entry):
-    def __init__(self, prefix: Union[str, IPv4Network, IPv6Network], action=PERMIT, family=None, le=None, ge=None):
-        type_mask = {'ipv4': 32, 'ipv6': 128}
+    __slots__ = ('le', 'ge')
 
+    def __init__(self, prefix: Union[str, IPv4Network, IPv6Network], action=PERMIT, family=None, le=None, ge=None):
         super().__init__(prefix, action, family)
+        max_len = _TYPE_MASK[self.family]
 
         # The 'any' prefix-list entry has a special action
         if self.prefix == 'any':
-            self.prefix = ip_network("0.0.0.0/0") if self.family == 'ipv4' \
-                else ip_network('::/0')
-            self.le = type_mask[self.family]
+            self.prefix = _ANY_PREFIX[self.family]
+            self.le = max_len
+            self.ge = None
             return
 
         if le is not None:
-            assert 0 <= le <= type_mask[self.family], "assertion %d <= le (%d) <= %d failed" % (
-            0, le, type_mask[self.family])
+            assert 0 <= le <= max_len, "assertion %d <= le (%d) <= %d failed" % (
+            0, le, max_len)
         if ge is not None:
-            assert 0 <= ge <= type_mask[self.family], "assertion %d <= ge (%d) <= %d failed" % (
-            0, ge, type_mask[self.family])
+            assert 0 <= ge <= max_len, "assertion %d <= ge (%d) <= %d failed" % (
+            0, ge, max_len)
         if le is not None and ge is not None:
             assert le >= ge, "assertion le (%d) >= ge (%d) failed! le must be lower than ge" % (le, ge)
 
@@ -193,8 +242,30 @@ class PrefixListEntry(Entry):
         self.ge = ge
 
 
+def _entry_from_prefix(entry_cls, prefix, family):
+    return entry_cls(prefix=prefix)
+
+
+def _entry_from_str(entry_cls, prefix, family):
+    if prefix == 'any':
+        return entry_cls(prefix=prefix, family=family)
+    return entry_cls(prefix=prefix)
+
+
+def _specific_first(entry):
+    # The 'any' access-list entries keep a string prefix
+    return -getattr(entry.prefix, 'prefixlen', 0), entry.action != PERMIT
+
+
+# How to build a zebra-list entry, depending on the type of the prefix
+_ENTRY_BUILDERS = {IPv4Network: _entry_from_prefix,
+                   IPv6Network: _entry_from_prefix,
+                   str: _entry_from_str}
+
+
 class ZebraList(ABC):
-    count = 0
+    # Numbers the zebra-lists
+    _counter = itertools.count(1)
 
     @property
     @abstractmethod
@@ -206,50 +277,64 @@ class ZebraList(ABC):
     def Entry(self):
         raise NotImplementedError
 
-    @property
-    @abstractmethod
-    def zebra_family(self):
-        raise NotImplementedError
+    # The zebra keyword of the list for each address family
+    ZEBRA_FAMILIES = {}  # type: Dict[str, str]
 
     def __init__(self, family, entries: Sequence[Union['ZebraList.Entry',
                                                        str, IPv4Network,
-                                                       IPv6Network]] = (), name=None):
+                                                       IPv6Network]] = (), name=None,
+                 sort=False):
         """Setup a new zebra-list
         :param name: The name of the acl, which will default to acl## where ##
                      is the instance number
         :param entries: A sequence of ZebraListEntry instance,
                         or of ip_interface which describes which prefixes
-                         are composing the list"""
-
-        assert family in {'ipv4', 'ipv6'}, "PrefixList unknown %s type. type must be either ipv4 or ipv6" % family
-
-        ZebraList.count += 1
-
-        self.name = name if name else '%s%d' % (self.prefix_name, ZebraList.count)
-        self.entries = []
-        for e in entries:
-            if isinstance(e, self.Entry):
-                assert e.family == family, "The prefix entry must be of the same type"
-                self.entries.append(e)
-            elif isinstance(e, str) and e == 'any':
-                self.entries.append(self.Entry(prefix=e, family=family))
-            elif isinstance(e, IPv4Network) or isinstance(e, IPv6Network) or isinstance(e, str):
-                self.entries.append(self.Entry(prefix=e))
-            else:
-                raise ValueError('"%s" is not a valid prefix entry for the %s family' % (e, family))
+                         are composing the list
+        :param sort: Whether to order the entries from the most specific
+                     prefix to the least specific one (permit entries first
+                     for a given length) instead of keeping the given order.
+                     As entries are matched in order, only use it if the
+                     list does not rely on the ordering of its entries."""
+
+        assert family in {'ipv4', 'ipv6'}, f"PrefixList unknown {family} type. type must be either ipv4 or ipv6"
+
+        number = next(ZebraList._counter)
+
+        # Interned such that equal names are most often the same object
+        self.name = sys.intern(name if name else f'{self.prefix_name}{number}')
+        entry_cls = self.Entry
+        self.entries = [self._make_entry(entry_cls, e, family)
+                        for e in entries]
+        if sort:
+            self.entries.sort(key=_specific_first)
 
         self.family = family
+        self.zebra_family = self.ZEBRA_FAMILIES[family]
+
+    @staticmethod
+    def _make_entry(entry_cls, e, family):
+        builder = _ENTRY_BUILDERS.get(type(e))
+        if builder is not None:
+            return builder(entry_cls, e, family)
+        if isinstance(e, entry_cls):
+            assert e.family == family, "The prefix entry must be of the same type"
+            return e
+        # Subclasses of the supported prefix types
+        for prefix_type, builder in _ENTRY_BUILDERS.items():
+            if isinstance(e, prefix_type):
+                return builder(entry_cls, e, family)
+        raise ValueError('"%s" is not a valid prefix entry for the %s family' % (e, family))
 
     def __eq__(self, other):
-        return self.name == other.name
+        other_name = other.name
+        return self.name is other_name or self.name == other_name
+
+    def __hash__(self):
+        return hash(self.name)
 
 
 class PrefixList(ZebraList):
-    @property
-    def zebra_family(self):
-        if self.family == 'ipv4':
-            return 'ip'
-        return 'ipv6'
+    ZEBRA_FAMILIES = {'ipv4': 'ip', 'ipv6': 'ipv6'}
 
     @property
     def prefix_name(self):
@@ -264,11 +349,7 @@ class AccessList(ZebraList):
     """A zebra access-list class. It contains a set of AccessListEntry,
     which describes all prefix belonging or not to this ACL"""
 
-    @property
-    def zebra_family(self):
-        if self.family == 'ipv4':
-            return ''
-        return 'ipv6 '
+    ZEBRA_FAMILIES = {'ipv4': '', 'ipv6': 'ipv6 '}
 
     @property
     def prefix_name(self):
@@ -279,11 +360,17 @@ class AccessList(ZebraList):
         return AccessListEntry
 
 
+# The conditions whose value is the name of a zebra-list
+_NAMED_CONDITIONS = {'access-list', 'prefix-list', 'community'}
+
+
 class RouteMapMatchCond:
     """
     A class representing a RouteMap matching condition
     """
 
+    __slots__ = ('condition', 'cond_type', 'family')
+
     def __init__(self, cond_type: str, condition, family: Optional[str] = None):
         """
         :param condition: Can be an ip address, the id of an access
@@ -295,32 +382,38 @@ class RouteMapMatchCond:
         """
         if family:
             assert family in {'ipv4', 'ipv6', 'community'}, "Unrecognized family type (%s)" % family
+        # Use a canonical and hashable form of the condition
+        if cond_type in _NAMED_CONDITIONS:
+            condition = sys.intern(str(condition))
+        elif isinstance(condition, (list, set, frozenset)):
+            condition = tuple(sorted(condition))
         self.condition = condition
         self.cond_type = cond_type
         self.family = family
 
     @property
     def zebra_family(self):
-        if self.family == 'ipv4':
-            return 'ip'
-        elif self.family == 'ipv6':
-            return 'ipv6'
-        elif self.family == 'community':
-            return 'community'
-
-        raise ValueError('Unsupported family; %s' % self.family)
+        try:
+            return _ZFAM[self.family]
+        except KeyError:
+            raise ValueError('Unsupported family; %s' % self.family)
 
     def __eq__(self, other):
         return self.condition == other.condition \
                and self.cond_type == other.cond_type \
                and self.family == other.family
 
+    def __hash__(self):
+        return hash((self.condition, self.cond_type, self.family))
+
 
 class RouteMapSetAction:
     """
     A class representing a RouteMap set action
     """
 
+    __slots__ = ('action_type', 'value')
+
     def __init__(self, action_type: str, value):
         """
         :param action_type: Type of value to me modified
@@ -333,6 +426,9 @@ class RouteMapSetAction:
         return self.action_type == other.action_type \
                and self.value == other.value
 
+    def __hash__(self):
+        return hash((self.action_type, self.value))
+
 
 class RouteMapEntry:
     def __init__(self, family: str, match_policy=PERMIT,
@@ -358,13 +454,18 @@ class RouteMapEntry:
         self.family = family
 
         self.match_policy = match_policy
-        self.match_cond = [e if isinstance(e, RouteMapMatchCond)
-                           else RouteMapMatchCond(cond_type=e[0],
-                                                  condition=e[1],
-                                                  family=family)
+        # Conditions and actions are mostly given as literal tuples
+        match_cls = RouteMapMatchCond
+        action_cls = RouteMapSetAction
+        self.match_cond = [match_cls(cond_type=e[0], condition=e[1],
+                                     family=family)
+                           if type(e) is tuple or not isinstance(e, match_cls)
+                           else e
                            for e in match_cond]
-        self.set_actions = [e if isinstance(e, RouteMapSetAction)
-                            else RouteMapSetAction(action_type=e[0], value=e[1])
+        self.set_actions = [action_cls(action_type=e[0], value=e[1])
+                            if type(e) is tuple
+                            or not isinstance(e, action_cls)
+                            else e
                             for e in set_actions]
         self.call_action = call_action
         self.exit_policy = exit_policy
@@ -374,8 +475,10 @@ class RouteMapEntry:
 
         :return:
         """
+        present = set(self.match_cond)
         for match_condition in match_conditions:
-            if match_condition not in self.match_cond:
+            if match_condition not in present:
+                present.add(match_condition)
                 self.match_cond.append(match_condition)
 
     def append_set_action(self, set_actions):
@@ -384,8 +487,10 @@ class RouteMapEntry:
         :param set_actions:
         :return:
         """
+        present = set(self.set_actions)
         for set_action in set_actions:
-            if set_action not in self.set_actions:
+            if set_action not in present:
+                present.add(set_action)
                 self.set_actions.append(set_action)
 
     def update(self, rm_entry: 'RouteMapEntry'):
@@ -405,8 +510,8 @@ class RouteMapEntry:
 class RouteMap:
     """A class representing a set of route maps applied to a given protocol"""
 
-    # Number of route maps
-    count = 0
+    # Numbers the route maps
+    _counter = itertools.count(1)
     DEFAULT_POLICY = 65535
 
     def __init__(self, family: str, name: Optional[str] = None,
@@ -418,13 +523,15 @@ class RouteMap:
         :param neighbor: List of peers this route map is applied to
         :param direction: Direction of the routemap(in, out, both)
         """
-        RouteMap.count += 1
+        number = next(RouteMap._counter)
 
         assert family in {'ipv4', 'ipv6', 'community'}, "Unrecognized family"
 
-        self.name = name if name else 'rm%d' % RouteMap.count
+        self.name = name if name else f'rm{number}'
 
         self.entries = dict()  # type: Dict[int, 'RouteMapEntry']
+        # The keys of self.entries, kept in increasing order
+        self._orders = []  # type: List[int]
 
         self.neighbor = neighbor
         self.direction = direction
@@ -441,7 +548,7 @@ class RouteMap:
 
     def _inc_order(self):
         self._hi_order += 10
-        assert self._hi_order < self.DEFAULT_POLICY, "Maximum route-map order exceeded (> %d)" % self.DEFAULT_POLICY
+        assert self._hi_order < self.DEFAULT_POLICY, f"Maximum route-map order exceeded (> {self.DEFAULT_POLICY})"
 
     def default_policy_set(self):
         return self._default_policy_set
@@ -457,23 +564,41 @@ class RouteMap:
 
         if order not in self.entries:
             self.entries[order] = rm_entry
+            insort(self._orders, order)
         else:
             self.entries[order].update(rm_entry)
 
     def remove_entry(self, order: int):
         if order in self.entries:
             self.entries.pop(order, None)
+            del self._orders[bisect_left(self._orders, order)]
 
     def remove_default_policy(self):
-        if self.DEFAULT_POLICY in self.entries:
-            self.entries.pop(self.DEFAULT_POLICY, None)
+        self.remove_entry(self.DEFAULT_POLICY)
+
+    @property
+    def orders(self) -> List[int]:
+        """Return the orders of the entries of this route map, in increasing
+        order"""
+        return self._orders
 
     def update(self, rm: 'RouteMap'):
         if self != rm:
             raise ValueError("Attempting to update incompatible RouteMaps")
 
-        for order in rm.entries.keys():
-            self.entry(rm.entries[order], order)
+        # Entries at the same order are merged, the others are added as is
+        for order in rm.entries.keys() & self.entries.keys():
+            self.entries[order].update(rm.entries[order])
+        new_orders = rm.entries.keys() - self.entries.keys()
+        if not new_orders:
+            return
+        self.entries.update({order: rm.entries[order] for order in new_orders})
+        self._orders = sorted(self._orders + list(new_orders))
+        if self.DEFAULT_POLICY in new_orders:
+            self._default_policy_set = True
+        self._hi_order = max(self._hi_order,
+                             max((order for order in new_orders
+                                  if order != self.DEFAULT_POLICY), default=0))
 
     def find_entry_by_match_condition(self, condition: Sequence['RouteMapMatchCond']):
         for entry in self.entries:
@@ -490,6 +615,11 @@ class RouteMap:
                and self.proto == other.proto \
                and self.neighbor == other.neighbor
 
+    def __hash__(self):
+        # Only the identity fields of __eq__, the entries may change
+        return hash((self.name, self.direction, self.family,
+                     frozenset(self.proto), self.neighbor))
+
     @property
     def describe(self):
         """Return the zebra description of this route map and apply it to the
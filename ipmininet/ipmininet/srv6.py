@@ -1,11 +1,15 @@
 """This modules defines classes to create IPv6 Segment Routing (SRv6) Routes
    For more information about SRv6, see https://segment-routing.org"""
 import abc
-import shlex
+import functools
+import json
+import re
 import subprocess
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from ipaddress import IPv6Address, AddressValueError, NetmaskValueError, \
     IPv4Address, IPv6Network
-from typing import List, Union, Iterable, Optional
+from typing import List, Union, Iterable, Optional, Tuple, Set, Dict
 
 from mininet.log import lg as log
 
@@ -15,23 +19,48 @@ from .router import IPNode
 from .utils import address_pair, realIntfList
 
 
+# The destination of the routes that do not specify one
+DEFAULT_DESTINATION = "::/0"
+
+
 def enable_srv6(node: IPNode):
     """
     Enable IPv6 Segment Routing parsing on all interfaces of the node
     """
-    node.nconfig.sysctl = "net.ipv6.conf.all.seg6_enabled=1"
-    node.nconfig.sysctl = "net.ipv6.conf.default.seg6_enabled=1"
-    for intf in realIntfList(node):
-        node.nconfig.sysctl = "net.ipv6.conf.%s.seg6_enabled=1" % intf.name
+    if getattr(node, "_srv6_enabled", False):
+        return
+    for intf in ("all", "default", *(i.name for i in realIntfList(node))):
+        node.nconfig.sysctl = "net.ipv6.conf.%s.seg6_enabled=1" % intf
+    node._srv6_enabled = True
+
+
+def ip6_batch(node: IPNode, cmds: Iterable[str], force=False) \
+        -> Tuple[str, str, int]:
+    """
+    Run several IPv6 iproute2 commands in a single ip process
+
+    :param node: The node on which the commands are run
+    :param cmds: The commands, without the leading "ip -6"
+    :param force: Whether to run all commands even if some of them fail
+    :return: stdout, stderr and the exit code of ip
+    """
+    args = ["ip", "-6", "-batch", "-"]
+    if force:
+        args.insert(1, "-force")
+    p = node.popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                   stderr=subprocess.PIPE)
+    out, err = p.communicate("".join(cmd + "\n" for cmd in cmds).encode())
+    return out.decode(), err.decode(), p.returncode
 
 
+@functools.lru_cache(maxsize=None)
 def check_srv6_compatibility() -> bool:
     """
     :return: True if the distribution supports SRv6
     """
     try:
         subprocess.check_output(
-            shlex.split("sysctl net.ipv6.conf.all.seg6_enabled"))
+            ["sysctl", "net.ipv6.conf.all.seg6_enabled"])
         return True
     except subprocess.CalledProcessError:
         return False
@@ -54,6 +83,23 @@ def srv6_segment_space(node: Optional[Union[str, IPNode]] = None,
     return [ip.network for ip in intf.ip6s(exclude_lls=True, exclude_lbs=True)]
 
 
+# The characters of IPv4 and IPv6 addresses
+_IP_CHARS = re.compile(r"^[0-9a-fA-F:./]+$")
+
+
+def _may_be_ip(value, separator: str = "") -> bool:
+    """Return False if value is a node, an interface or a string that cannot
+    be an IP address or prefix, i.e., the values that do not have to be
+    parsed.
+
+    :param separator: A character that the string must contain"""
+    if isinstance(value, (IPNode, IPIntf)):
+        return False
+    if isinstance(value, str):
+        return separator in value and _IP_CHARS.match(value) is not None
+    return True
+
+
 class LocalSIDTable:
     """A class representing a LocalSID routing table"""
 
@@ -85,15 +131,7 @@ class LocalSIDTable:
                                  .format(destination))
 
         # Find Free table number
-        tables = []
-        out = self.node.cmd("ip rule list")
-        lines = out.split("\n")
-        for line in lines:
-            if "lookup " in line:
-                try:
-                    tables.append(int(line.split("lookup ")[-1]))
-                except ValueError:
-                    pass
+        tables = self._used_tables(self.node)
         self.num = 1
         while self.num in tables:
             self.num += 1
@@ -103,37 +141,65 @@ class LocalSIDTable:
         # Create the table
         self.create()
 
+    @staticmethod
+    def _node_tables(node: IPNode) -> Set[int]:
+        """Return the set of the table numbers held by the LocalSIDTables of
+        the node"""
+        tables = getattr(node, "_srv6_tables", None)
+        if tables is None:
+            tables = node._srv6_tables = set()
+        return tables
+
+    @staticmethod
+    def _used_tables(node: IPNode) -> Set[int]:
+        """Return the table numbers used by the IPv6 rules of the node or
+        held by its LocalSIDTables. The rules are listed again for each
+        table since they can be changed outside of this class."""
+        tables = set(LocalSIDTable._node_tables(node))
+        for rule in json.loads(node.cmd("ip -j -6 rule list") or "[]"):
+            try:
+                tables.add(int(rule.get("table")))
+            except (TypeError, ValueError):
+                # Named tables (e.g., main) or other actions
+                pass
+        return tables
+
     def create(self):
-        self.clean()
-        for prefix in self.prefixes:
-            cmd = "ip -6 rule add to {prefix} table {num}"\
+        self._flush()
+        self._node_tables(self.node).add(self.num)
+        cmds = ["rule add to {prefix} table {num}"
                 .format(prefix=prefix, num=self.num)
-            out, err, exitcode = self.node.pexec(shlex.split(cmd))
-            if exitcode != 0:
-                log.error("Cannot install rule for new LocalSIDTable:\n"
-                          "{cmd}\nstdout:{out}\nstderr:{err}\n"
-                          .format(cmd=cmd, out=out, err=err))
-        cmd = "ip -6 route add blackhole default table {num}"\
-            .format(num=self.num)
-        out, err, exitcode = self.node.pexec(cmd)
+                for prefix in self.prefixes]
+        cmds.append("route add blackhole default table {num}"
+                    .format(num=self.num))
+        # Each command is still attempted if a previous one fails
+        out, err, exitcode = ip6_batch(self.node, cmds, force=True)
         if exitcode != 0:
-            log.error("Cannot install blackhole rule for new LocalSIDTable:\n"
+            log.error("Cannot install the rules of new LocalSIDTable:\n"
                       "{cmd}\nstdout:{out}\nstderr:{err}\n"
-                      .format(cmd=cmd, out=out, err=err))
+                      .format(cmd="\n".join(cmds), out=out, err=err))
 
     def clean(self):
-        self.node.cmd("ip -6 route flush table {num}".format(num=self.num))
-        for prefix in self.prefixes:
-            self.node.cmd(shlex.split("ip rule del to {prefix} table {num}"
-                                      .format(prefix=prefix, num=self.num)))
+        self._flush()
+        # The number can be used by the next tables
+        self._node_tables(self.node).discard(self.num)
+
+    def _flush(self):
+        # The rules may not exist, hence the errors are ignored
+        cmds = ["route flush table {num}".format(num=self.num)]
+        cmds.extend("rule del to {prefix} table {num}"
+                    .format(prefix=prefix, num=self.num)
+                    for prefix in self.prefixes)
+        ip6_batch(self.node, cmds, force=True)
 
 
 class SRv6Route(metaclass=abc.ABCMeta):
     """The SRv6Route abstract class, which enables to create an SRv6 route"""
 
     def __init__(self, net: IPNet, node: Union[IPNode, str],
-                 to: Union[str, IPv6Network, IPNode, IPIntf] = "::/0", cost=1,
-                 table: Optional[LocalSIDTable] = None):
+                 to: Union[str, IPv6Network, IPNode, IPIntf] =
+                 DEFAULT_DESTINATION, cost=1,
+                 table: Optional[LocalSIDTable] = None, install=True):
         """
         :param net: The IPNet instance
         :param node: The IPNode object on which the route has to be installed
@@ -144,31 +210,40 @@ class SRv6Route(metaclass=abc.ABCMeta):
                      preferred if the destination prefix is the same.
         :param table: Install the route into the specified table instead of
                       the main one.
+        :param install: Whether to install the route right away. Otherwise,
+                        the route is installed by its install() method or
+                        by install_all().
         """
         self.net = net
         self.table = table
         self.destination = to
         self.cost = cost
         self.source = node if not isinstance(node, str) else net[node]
-        itfs = realIntfList(self.source)
-        if len(itfs) == 0:
-            raise ValueError("Cannot install SRv6Route %s without"
-                             " a real interface on node %s\n"
-                             % (self, self.source.name))
-        self.dev = itfs[0].name
+        # All the routes of a node use the same device
+        self.dev = getattr(self.source, "_srv6_dev", None)
+        if self.dev is None:
+            itfs = realIntfList(self.source)
+            if len(itfs) == 0:
+                raise ValueError("Cannot install SRv6Route %s without"
+                                 " a real interface on node %s\n"
+                                 % (self, self.source.name))
+            self.dev = self.source._srv6_dev = itfs[0].name
 
         # Check SRv6 capability
         if not self.is_available():
             raise ValueError("Cannot create %s because"
                              " the distribution does not support it" % self)
 
-        # Activate SRv6 on all routers and hosts
-        for n in net.routers + net.hosts:
-            enable_srv6(n)
+        # Activate SRv6 on all routers and hosts, once per network
+        if not getattr(net, "_srv6_enabled", False):
+            for n in net.routers + net.hosts:
+                enable_srv6(n)
+            net._srv6_enabled = True
 
         # Add routes
         self.cmds = self.build_commands()
-        self.install()
+        if install:
+            self.install()
 
     def is_available(self) -> bool:
         """Check the compatibility with this encapsulation method"""
@@ -176,30 +251,38 @@ class SRv6Route(metaclass=abc.ABCMeta):
 
     def dest_prefixes(self) -> List[str]:
         prefixes = []
-        try:
-            IPv6Network(str(self.destination))
-            # This is an IPv6 address
-            prefixes.append(str(self.destination))
-        except (AddressValueError, NetmaskValueError):
-            if isinstance(self.destination, str):
-                try:
-                    self.destination = self.net[self.destination]
-                except KeyError:
-                    pass
-
-            if isinstance(self.destination, IPNode):
-                for itf in self.destination.intfList():
-                    for ip6 in itf.ip6s(exclude_lls=True, exclude_lbs=True):
-                        prefixes.append(ip6.network.with_prefixlen)
-            elif isinstance(self.destination, IPIntf):
-                for ip6 in self.destination.ip6s(exclude_lls=True,
-                                                 exclude_lbs=True):
+        if isinstance(self.destination, IPv6Network):
+            return [self.destination.with_prefixlen]
+        if self.destination == DEFAULT_DESTINATION:
+            return [DEFAULT_DESTINATION]
+        # Only parse the destinations that can be an IPv6 prefix
+        if _may_be_ip(self.destination, ":"):
+            try:
+                IPv6Network(str(self.destination))
+                # This is an IPv6 address
+                return [str(self.destination)]
+            except (AddressValueError, NetmaskValueError):
+                pass
+
+        if isinstance(self.destination, str):
+            try:
+                self.destination = self.net[self.destination]
+            except KeyError:
+                pass
+
+        if isinstance(self.destination, IPNode):
+            for itf in self.destination.intfList():
+                for ip6 in itf.ip6s(exclude_lls=True, exclude_lbs=True):
                     prefixes.append(ip6.network.with_prefixlen)
+        elif isinstance(self.destination, IPIntf):
+            for ip6 in self.destination.ip6s(exclude_lls=True,
+                                             exclude_lbs=True):
+                prefixes.append(ip6.network.with_prefixlen)
 
-            if len(prefixes) == 0:
-                log.error("Cannot install SRv6Route", self,
-                          "because the destination", self.destination,
-                          "does not have a global IPv6 address\n")
+        if len(prefixes) == 0:
+            log.error("Cannot install SRv6Route", self,
+                      "because the destination", self.destination,
+                      "does not have a global IPv6 address\n")
         return prefixes
 
     def nexthops_to_ips(self,
@@ -214,29 +297,37 @@ class SRv6Route(metaclass=abc.ABCMeta):
         :param v6: Whether we return IPv6 or IPv4 addresses
         :return: a list of addresses
         """
-        s = []
-        for nh in nexthops:
+        return [self._nexthop_to_ip(nh, v6) for nh in nexthops]
+
+    def _nexthop_to_ip(self, nh: Union[str, IPNode, IPIntf, IPv6Address,
+                                       IPv4Address], v6: bool) -> str:
+        addr_type = IPv6Address if v6 else IPv4Address
+        if isinstance(nh, addr_type):
+            return str(nh)
+        # Only parse the nexthops that can be an address
+        if _may_be_ip(nh):
             try:
-                IPv6Address(str(nh)) if v6 else IPv4Address(str(nh))
+                addr_type(str(nh))
                 # This is an IPv6 or IPv4 address
-                s.append(str(nh))
+                return str(nh)
             except (AddressValueError, NetmaskValueError):
-                if isinstance(nh, str):
-                    try:
-                        nh = self.net[nh]
-                    except KeyError:
-                        pass
-                ip = None
-                if isinstance(nh, IPNode):
-                    ip = address_pair(nh, use_v4=not v6)[1 if v6 else 0]
-                elif isinstance(nh, IPIntf):
-                    ip = nh.ip6 if v6 else nh.ip
-                if ip is None:
-                    raise ValueError("Cannot find for the nexthop %s"
-                                     " a global IPv%d address\n"
-                                     % (nh, 6 if v6 else 4))
-                s.append(ip)
-        return s
+                pass
+
+        if isinstance(nh, str):
+            try:
+                nh = self.net[nh]
+            except KeyError:
+                pass
+        ip = None
+        if isinstance(nh, IPNode):
+            ip = address_pair(nh, use_v4=not v6)[1 if v6 else 0]
+        elif isinstance(nh, IPIntf):
+            ip = nh.ip6 if v6 else nh.ip
+        if ip is None:
+            raise ValueError("Cannot find for the nexthop %s"
+                             " a global IPv%d address\n"
+                             % (nh, 6 if v6 else 4))
+        return ip
 
     @abc.abstractmethod
     def build_commands(self) -> List[str]:
@@ -246,21 +337,25 @@ class SRv6Route(metaclass=abc.ABCMeta):
         self._run_cmds()
 
     def cleanup(self):
-        self._run_cmds(prefix="ip -6 route add ")
-
-    def _run_cmds(self, prefix: str = "ip -6 route add ") -> int:
-        for cmd in self.cmds:
-            cmd = prefix + cmd
-            if self.table is not None:
-                cmd = cmd + " table {num}".format(num=self.table.num)
-            out, err, code = self.source.pexec(shlex.split(cmd))
-            log.debug("Installing route on router %s: '%s'\n"
-                      % (self.source.name, cmd))
-            if code:
-                log.error('Cannot install SRv6Route', self, '[rcode:',
-                          str(code), ']:\n', cmd, '\nstdout:', str(out),
-                          '\nstderr:', str(err))
-                return code
+        self._run_cmds(action="del")
+
+    def _run_cmds(self, action: str = "add") -> int:
+        suffix = "" if self.table is None \
+            else " table {num}".format(num=self.table.num)
+        cmds = ["route {action} {cmd}{suffix}"
+                .format(action=action, cmd=cmd, suffix=suffix)
+                for cmd in self.cmds]
+        if len(cmds) == 0:
+            return -1
+        log.debug("Installing routes on router %s: '%s'\n"
+                  % (self.source.name, "', '".join(cmds)))
+        # ip stops at the first failing command and reports its line number
+        out, err, code = ip6_batch(self.source, cmds)
+        if code:
+            log.error('Cannot install SRv6Route', self, '[rcode:',
+                      str(code), ']:\n', "\n".join(cmds), '\nstdout:',
+                      str(out), '\nstderr:', str(err))
+            return code
         return -1
 
     def __str__(self):
@@ -268,6 +363,31 @@ class SRv6Route(metaclass=abc.ABCMeta):
                % (self.source.name, self.destination, self.cost)
 
 
+def install_all(routes: Iterable[SRv6Route]):
+    """
+    Install routes created with install=False. The routes of different nodes
+    are installed concurrently, while the routes of a given node are
+    installed one after the other, in the given order.
+
+    :param routes: The routes to install
+    """
+    per_node = {}  # type: Dict[IPNode, List[SRv6Route]]
+    for route in routes:
+        per_node.setdefault(route.source, []).append(route)
+    if len(per_node) == 0:
+        return
+
+    def install_node_routes(node_routes: List[SRv6Route]):
+        for node_route in node_routes:
+            node_route.install()
+
+    # Each installation mostly waits for an ip process
+    with ThreadPoolExecutor(max_workers=min(32, len(per_node))) as executor:
+        for future in [executor.submit(install_node_routes, node_routes)
+                       for node_routes in per_node.values()]:
+            future.result()
+
+
 class SRv6Encap(SRv6Route):
     """The SRv6Encap class, which enables to create an IPv6
     Segment Routing encapsulation in a router.
@@ -279,9 +399,10 @@ class SRv6Encap(SRv6Route):
     INLINE = "inline"
 
     def __init__(self, net: IPNet, node: Union[IPNode, str],
-                 to: Union[str, IPv6Network, IPNode, IPIntf] = "::/0",
+                 to: Union[str, IPv6Network, IPNode, IPIntf] =
+                 DEFAULT_DESTINATION,
                  through: List[Union[str, IPv6Address, IPNode, IPIntf]] = (),
-                 mode=ENCAP, cost=1):
+                 mode=ENCAP, cost=1, install=True):
         """
         :param net: The IPNet instance
         :param node: The IPNode object on which the route has to be installed
@@ -298,18 +419,25 @@ class SRv6Encap(SRv6Route):
                      the packet.
         :param cost: The cost of using the route: routes with lower cost is
                      preferred if the destination prefix is the same.
+        :param install: Whether to install the route right away. Otherwise,
+                        the route is installed by its install() method or
+                        by install_all().
         """
         if len(through) == 0:
             raise ValueError("It does not make sense to use Segment Routing"
                              " without any redirection.")
         self.nexthops = list(through)
         self.mode = mode
-        super().__init__(net, node, to=to, cost=cost)
+        super().__init__(net, node, to=to, cost=cost, install=install)
 
     def is_available(self) -> bool:
         """Check the compatibility with this encapsulation method"""
-        return super().is_available() \
-            and subprocess.check_call(shlex.split("ip sr tunsrc set ::")) == 0
+        return super().is_available() and self._set_tunsrc()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _set_tunsrc() -> bool:
+        return subprocess.check_call(["ip", "sr", "tunsrc", "set", "::"]) == 0
 
     def build_commands(self) -> List[str]:
         cmds = []  # type: List[str]
@@ -340,6 +468,8 @@ class SRv6Encap(SRv6Route):
 class SRv6EndFunction(SRv6Route):
     """This class represents an SRv6 End function"""
     ACTION = "End"
+    # Whether each node supports the SRv6 End functions
+    _probed = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
 
     @property
     def params(self) -> str:
@@ -347,12 +477,20 @@ class SRv6EndFunction(SRv6Route):
 
     def is_available(self) -> bool:
         """Check the compatibility with this advanced SRv6 routes"""
-        cmd = "{seg} encap seg6local action End dev {dev}".format(seg="::2/128",
-                                                                  dev=self.dev)
+        if not super().is_available():
+            return False
+        # The probe route is only installed once per node, and removed
+        # by the same ip process. Any End function (e.g., End.X) is
+        # supported if End is.
         src = self.source
-        return super().is_available() \
-            and src.pexec(shlex.split("ip -6 route add " + cmd))[2] == 0 \
-            and src.pexec(shlex.split("ip -6 route del " + cmd))[2] == 0
+        available = self._probed.get(src)
+        if available is None:
+            cmd = "::2/128 encap seg6local action End dev {dev}"\
+                .format(dev=self.dev)
+            available = ip6_batch(src, ["route add " + cmd,
+                                        "route del " + cmd])[2] == 0
+            self._probed[src] = available
+        return available
 
     def build_commands(self) -> List[str]:
         cmds = []  # type: List[str]
@@ -0,0 +1,64 @@
+import functools
+
+import pytest
+
+from ipmininet.clean import cleanup
+from ipmininet.ipnet import IPNet
+from ipmininet.router.config import BGP
+
+# Aggressive BGP timers so that the test networks converge quickly.
+# OSPF and OSPF6 already use a 1s hello interval by default.
+FAST_BGP_TIMERS = {
+    "KEEPALIVE": 1,
+    "HOLDTIME": 4,
+    "CONNECT_RETRY": 5,
+    "ADVERTISEMENT_INTERVAL": 0,
+}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_bgp_timers():
+    """Session-scoped so that the networks started by module and class
+    fixtures also use the fast timers"""
+    saved = {name: getattr(BGP, name) for name in FAST_BGP_TIMERS}
+    for name, value in FAST_BGP_TIMERS.items():
+        setattr(BGP, name, value)
+    yield
+    for name, value in saved.items():
+        setattr(BGP, name, value)
+
+
+def start_net(request, topo, **kwargs) -> IPNet:
+    """Build and start the network of a topology. The network is stopped
+    and cleaned up when the scope of the fixture request ends."""
+    try:
+        net = IPNet(topo=topo, **kwargs)
+    except Exception:
+        # The topology may have been partially created
+        cleanup()
+        raise
+
+    def stop():
+        try:
+            net.stop()
+        finally:
+            cleanup()
+
+    request.addfinalizer(stop)
+    net.start()
+    return net
+
+
+@pytest.fixture
+def started_net(request):
+    """Return a function building and starting the network of a topology.
+    The network is stopped and cleaned up at the end of the test."""
+    return functools.partial(start_net, request)
+
+
+@pytest.fixture(scope="session")
+def scoped_net():
+    """Return start_net() for the fixtures sharing a network across a class
+    or a module, they pass their own request so that the network lives as
+    long as they do"""
+    return start_net
@@ -1,8 +1,8 @@
 """This module tests the BGP daemon"""
+from typing import FrozenSet, Tuple
 
 import pytest
 
-from ipmininet.clean import cleanup
 from ipmininet.examples.simple_bgp_network import SimpleBGPTopo
 from ipmininet.examples.bgp_local_pref import BGPTopoLocalPref
 from ipmininet.examples.bgp_med import BGPTopoMed
@@ -14,12 +14,12 @@ from ipmininet.examples.bgp_policies_4 import BGPPoliciesTopo4
 from ipmininet.examples.bgp_policies_3 import BGPPoliciesTopo3
 from ipmininet.examples.bgp_policies_5 import BGPPoliciesTopo5
 from ipmininet.examples.bgp_policies_adjust import BGPPoliciesAdjustTopo
-from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.router.config import BGP, bgp_peering, AS, iBGPFullMesh
 from ipmininet.router.config.base import RouterConfig
 from ipmininet.router.config.bgp import AF_INET, AF_INET6, CLIENT_PROVIDER
-from ipmininet.tests.utils import assert_connectivity, assert_path
+from ipmininet.tests.utils import assert_connectivity, assert_paths, \
+    assert_dual_stack_connectivity
 from . import require_root
 
 
@@ -89,19 +89,24 @@ class BGPTopo(IPTopo):
 
 
 @require_root
-def test_bgp_example():
-    try:
-        net = IPNet(topo=SimpleBGPTopo())
-        net.start()
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_example(started_net):
+    net = started_net(SimpleBGPTopo())
+    assert_dual_stack_connectivity(net)
+    # Check that the node names are resolved through /etc/hosts
+    assert_dual_stack_connectivity(net, translate_address=False)
 
 
-@require_root
-@pytest.mark.parametrize("bgp_params,expected_cfg", [
+def read_cfg_lines(path: str) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+    """Return the non-empty lines of a configuration file, in order and as
+    a set"""
+    with open(path) as fileobj:
+        raw = fileobj.read()
+    lines = tuple(line for line in (line.strip() for line in raw.split("\n"))
+                  if line)
+    return lines, frozenset(lines)
+
+
+bgp_daemon_params = [
     ({"address_families": [AF_INET(redistribute=["connected"]),
                            AF_INET6(redistribute=["connected"])]},
      ["router bgp 2",
@@ -117,26 +122,33 @@ def test_bgp_example():
                                     networks=["fd00:2001:180::/64"])]},
      ["network 10.0.0.0/24",
       "network fd00:2001:180::/64"]),
-])
-def test_bgp_daemon_params(bgp_params, expected_cfg):
-    try:
-        net = IPNet(topo=BGPTopo(bgp_params), allocate_IPs=False)
-        net.start()
-
-        # Check generated configuration
-        with open("/tmp/bgpd_as2r1.cfg") as fileobj:
-            cfg = [line for line in (line.strip() for line in fileobj) if line]
-            for line in expected_cfg:
-                assert line in cfg,\
-                    "Cannot find the line '%s' in the generated " \
-                    "configuration:\n%s" % (line, "".join(cfg))
-
-        # Check reachability
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+]
+
+
+@require_root
+class TestBGPDaemonParams:
+    """Each set of BGP parameters starts a single network shared by all
+    the checks of this class"""
+
+    @pytest.fixture(scope="class", params=bgp_daemon_params,
+                    ids=["redistribute", "networks"])
+    def bgp_net(self, request, scoped_net):
+        bgp_params, expected_cfg = request.param
+        net = scoped_net(request, BGPTopo(bgp_params), allocate_IPs=False)
+        return net, expected_cfg
+
+    def test_bgp_daemon_cfg(self, bgp_net):
+        net, expected_cfg = bgp_net
+        cfg_path = net["as2r1"].nconfig.daemon(BGP).cfg_filename
+        lines, cfg = read_cfg_lines(cfg_path)
+        for line in expected_cfg:
+            assert line in cfg,\
+                "Cannot find the line '%s' in the generated " \
+                "configuration:\n%s" % (line, "\n".join(lines))
+
+    def test_bgp_daemon_connectivity(self, bgp_net):
+        net, _ = bgp_net
+        assert_dual_stack_connectivity(net)
 
 
 local_pref_paths = [
@@ -150,15 +162,9 @@ local_pref_paths = [
 
 
 @require_root
-def test_bgp_local_pref():
-    try:
-        net = IPNet(topo=BGPTopoLocalPref())
-        net.start()
-        for path in local_pref_paths:
-            assert_path(net, path, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_local_pref(started_net):
+    net = started_net(BGPTopoLocalPref())
+    assert_paths(net, local_pref_paths, v6=True)
 
 
 med_paths = [
@@ -172,15 +178,9 @@ med_paths = [
 
 
 @require_root
-def test_bgp_med():
-    try:
-        net = IPNet(topo=BGPTopoMed())
-        net.start()
-        for path in med_paths:
-            assert_path(net, path, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_med(started_net):
+    net = started_net(BGPTopoMed())
+    assert_paths(net, med_paths, v6=True)
 
 
 rr_paths = [
@@ -194,15 +194,9 @@ rr_paths = [
 
 
 @require_root
-def test_bgp_rr():
-    try:
-        net = IPNet(topo=BGPTopoRR())
-        net.start()
-        for path in rr_paths:
-            assert_path(net, path, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_rr(started_net):
+    net = started_net(BGPTopoRR())
+    assert_paths(net, rr_paths, v6=True)
 
 
 full_paths = [
@@ -216,15 +210,9 @@ full_paths = [
 
 
 @require_root
-def test_bgp_full_config():
-    try:
-        net = IPNet(topo=BGPTopoFull())
-        net.start()
-        for path in full_paths:
-            assert_path(net, path, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_full_config(started_net):
+    net = started_net(BGPTopoFull())
+    assert_paths(net, full_paths, v6=True)
 
 
 policies_paths = {
@@ -234,7 +222,6 @@ policies_paths = {
         ['has1r1', 'as1r1', 'as2r1', 'as2r2', 'has2r2'],
         ['has2r1', 'as2r1', 'as5r1', 'has5r1'],
         ['has2r2', 'as2r2', 'as2r1', 'as5r1', 'has5r1'],
-        ['has2r2', 'as2r2', 'as2r1', 'as5r1', 'has5r1'],
         ['has4r1', 'as4r1', 'as5r1', 'as1r1', 'has1r1']
     ],
     BGPPoliciesTopo2.__name__: [
@@ -270,26 +257,15 @@ policies_paths = {
     BGPPoliciesTopo1, BGPPoliciesTopo2, BGPPoliciesTopo3,
     BGPPoliciesTopo4, BGPPoliciesTopo5, BGPPoliciesAdjustTopo
 ])
-def test_bgp_policies(topology):
-    try:
-        net = IPNet(topo=topology())
-        net.start()
-        for path in policies_paths[topology.__name__]:
-            assert_path(net, path, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_policies(started_net, topology):
+    net = started_net(topology())
+    assert_paths(net, policies_paths[topology.__name__], v6=True)
 
 
 @require_root
-def test_bgp_policies_adjust():
-    try:
-        # Adding this new peering link should enable all hosts
-        # to ping each others
-        net = IPNet(topo=BGPPoliciesAdjustTopo(as_start="as5r", as_end="as2r",
-                                               bgp_policy=CLIENT_PROVIDER))
-        net.start()
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_bgp_policies_adjust(started_net):
+    # Adding this new peering link should enable all hosts
+    # to ping each others
+    net = started_net(BGPPoliciesAdjustTopo(as_start="as5r", as_end="as2r",
+                                            bgp_policy=CLIENT_PROVIDER))
+    assert_connectivity(net, v6=True)
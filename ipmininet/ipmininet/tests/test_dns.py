@@ -1,16 +1,12 @@
 """This module tests the Named daemon"""
-import time
-
 import pytest
 
-from ipmininet.clean import cleanup
 from ipmininet.examples.dns_network import DNSNetwork
-from ipmininet.examples.simple_bgp_network import SimpleBGPTopo
 from ipmininet.examples.static_routing import StaticRoutingNet
 from ipmininet.host.config import Named, ARecord, AAAARecord, NSRecord, \
     PTRRecord
-from ipmininet.ipnet import IPNet
-from ipmininet.tests.utils import assert_connectivity, assert_dns_record
+from ipmininet.tests.utils import assert_dual_stack_connectivity, \
+    assert_dns_record, assert_dns_records, wait_for_dns
 from . import require_root
 from ..examples.dns_advanced_network import DNSAdvancedNetwork
 
@@ -61,129 +57,107 @@ class CustomDNSNetwork(DNSNetwork):
       "new   300\tIN\tA\t192.0.0.1",
       "test.org.   10\tIN\tNS\tnew.test.org."]),
 ])
-def test_dns_network(named_cfg, zone_args, exp_named_cfg, exp_zone_cfg):
-    try:
-        net = IPNet(topo=CustomDNSNetwork(named_cfg, zone_args))
-        net.start()
-
-        # Check generated configurations
-        with open("/tmp/named_master2.cfg") as fileobj:
-            cfg = fileobj.readlines()
-            for line in exp_named_cfg:
-                assert line + "\n" in cfg,\
-                    "Cannot find the line '%s' in the generated " \
-                    "main configuration:\n%s" % (line, "".join(cfg))
-        with open("/tmp/named_master2.test.org.zone.cfg") as fileobj:
-            cfg = fileobj.readlines()
-            for line in exp_zone_cfg:
-                assert line + "\n" in cfg,\
-                    "Cannot find the line '%s' in the generated zone " \
-                    "configuration:\n%s" % (line, "".join(cfg))
-
-        # Check port number configuration
-        dns_server_port = named_cfg.get("dns_server_port", 53)
-        assert_dns_record(net["master2"], "localhost",
-                          AAAARecord("master2.test.org",
-                                     net["master2"].defaultIntf().ip6),
-                          port=dns_server_port)
-
-        # Check connectivity
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        # Check generated DNS record
-        records = [
-            NSRecord("mydomain.org", "master"),
-            NSRecord("mydomain.org", "slave"),
-            ARecord("master.mydomain.org", net["master"].defaultIntf().ip),
-            AAAARecord("master.mydomain.org", net["master"].defaultIntf().ip6),
-            ARecord("slave.mydomain.org", net["slave"].defaultIntf().ip),
-            AAAARecord("slave.mydomain.org", net["slave"].defaultIntf().ip6),
-            ARecord("server.mydomain.org", net["server"].defaultIntf().ip),
-            AAAARecord("server.mydomain.org", net["server"].defaultIntf().ip6,
-                       ttl=120),
-            PTRRecord(net["master"].defaultIntf().ip, "master.mydomain.org"),
-            PTRRecord(net["master"].defaultIntf().ip6, "master.mydomain.org"),
-            PTRRecord(net["slave"].defaultIntf().ip, "slave.mydomain.org"),
-            PTRRecord(net["slave"].defaultIntf().ip6, "slave.mydomain.org"),
-            PTRRecord(net["server"].defaultIntf().ip, "server.mydomain.org"),
-            PTRRecord(net["server"].defaultIntf().ip6, "server.mydomain.org",
-                      ttl=120)
-        ]
-        for node in [net["master"], net["slave"]]:
-            for record in records:
-                assert_dns_record(node, "localhost", record)
-            time.sleep(10)
-
-        net.stop()
-    finally:
-        cleanup()
+def test_dns_network(started_net, named_cfg, zone_args, exp_named_cfg,
+                     exp_zone_cfg):
+    net = started_net(CustomDNSNetwork(named_cfg, zone_args))
+
+    # Check generated configurations
+    with open("/tmp/named_master2.cfg") as fileobj:
+        # Prepend a newline so that only whole lines are matched
+        cfg = "\n" + fileobj.read()
+    for line in exp_named_cfg:
+        assert "\n%s\n" % line in cfg,\
+            "Cannot find the line '%s' in the generated " \
+            "main configuration:\n%s" % (line, cfg)
+    with open("/tmp/named_master2.test.org.zone.cfg") as fileobj:
+        cfg = "\n" + fileobj.read()
+    for line in exp_zone_cfg:
+        assert "\n%s\n" % line in cfg,\
+            "Cannot find the line '%s' in the generated zone " \
+            "configuration:\n%s" % (line, cfg)
+
+    # Check port number configuration
+    dns_server_port = named_cfg.get("dns_server_port", 53)
+    assert_dns_record(net["master2"], "localhost",
+                      AAAARecord("master2.test.org",
+                                 net["master2"].defaultIntf().ip6),
+                      port=dns_server_port)
+
+    # Check connectivity
+    assert_dual_stack_connectivity(net)
+
+    # Check generated DNS record
+    records = [
+        NSRecord("mydomain.org", "master"),
+        NSRecord("mydomain.org", "slave"),
+        ARecord("master.mydomain.org", net["master"].defaultIntf().ip),
+        AAAARecord("master.mydomain.org", net["master"].defaultIntf().ip6),
+        ARecord("slave.mydomain.org", net["slave"].defaultIntf().ip),
+        AAAARecord("slave.mydomain.org", net["slave"].defaultIntf().ip6),
+        ARecord("server.mydomain.org", net["server"].defaultIntf().ip),
+        AAAARecord("server.mydomain.org", net["server"].defaultIntf().ip6,
+                   ttl=120),
+        PTRRecord(net["master"].defaultIntf().ip, "master.mydomain.org"),
+        PTRRecord(net["master"].defaultIntf().ip6, "master.mydomain.org"),
+        PTRRecord(net["slave"].defaultIntf().ip, "slave.mydomain.org"),
+        PTRRecord(net["slave"].defaultIntf().ip6, "slave.mydomain.org"),
+        PTRRecord(net["server"].defaultIntf().ip, "server.mydomain.org"),
+        PTRRecord(net["server"].defaultIntf().ip6, "server.mydomain.org",
+                  ttl=120)
+    ]
+    for node in [net["master"], net["slave"]]:
+        wait_for_dns(node, "localhost", records[0])
+        assert_dns_records(node, "localhost", records)
 
 
 @require_root
-def test_zone_delegation():
-    try:
-        net = IPNet(topo=DNSAdvancedNetwork())
-        net.start()
-
-        # Check connectivity
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        # Check zone delegation and root hinting
-        root_hints = [NSRecord("", "rootdns"),
-                      ARecord("rootdns", net["rootdns"].defaultIntf().ip),
-                      AAAARecord("rootdns",
-                                 net["rootdns"].defaultIntf().ip6)]
-        mydomain_delegation_records = [
-            NSRecord("mydomain.org", "master"),
-            NSRecord("mydomain.org", "slave"),
-            ARecord("master.mydomain.org", net["master"].defaultIntf().ip),
-            AAAARecord("master.mydomain.org", net["master"].defaultIntf().ip6),
-            ARecord("slave.mydomain.org", net["slave"].defaultIntf().ip),
-            AAAARecord("slave.mydomain.org", net["slave"].defaultIntf().ip6),
-        ]
-        org_delegation_records = [
-            NSRecord("org", "orgdns"),
-            ARecord("orgdns.org", net["orgdns"].defaultIntf().ip),
-            AAAARecord("orgdns.org", net["orgdns"].defaultIntf().ip6),
-        ]
-        records = [([net["master"], net["slave"]],
-                    mydomain_delegation_records
-                    + [ARecord("server.mydomain.org",
-                               net["server"].defaultIntf().ip),
-                       AAAARecord("server.mydomain.org",
-                                  net["server"].defaultIntf().ip6)]
-                    + root_hints),
-                   ([net["orgdns"]],
-                    org_delegation_records + mydomain_delegation_records
-                    + root_hints),
-                   ([net['rootdns']], root_hints + org_delegation_records)]
-        for nodes, zone_records in records:
-            for node in nodes:
-                for record in zone_records:
-                    assert_dns_record(node, "localhost", record)
-                time.sleep(10)
-
-        net.stop()
-    finally:
-        cleanup()
+def test_zone_delegation(started_net):
+    net = started_net(DNSAdvancedNetwork())
+
+    # Check connectivity
+    assert_dual_stack_connectivity(net)
+
+    # Check zone delegation and root hinting
+    root_hints = [NSRecord("", "rootdns"),
+                  ARecord("rootdns", net["rootdns"].defaultIntf().ip),
+                  AAAARecord("rootdns",
+                             net["rootdns"].defaultIntf().ip6)]
+    mydomain_delegation_records = [
+        NSRecord("mydomain.org", "master"),
+        NSRecord("mydomain.org", "slave"),
+        ARecord("master.mydomain.org", net["master"].defaultIntf().ip),
+        AAAARecord("master.mydomain.org", net["master"].defaultIntf().ip6),
+        ARecord("slave.mydomain.org", net["slave"].defaultIntf().ip),
+        AAAARecord("slave.mydomain.org", net["slave"].defaultIntf().ip6),
+    ]
+    org_delegation_records = [
+        NSRecord("org", "orgdns"),
+        ARecord("orgdns.org", net["orgdns"].defaultIntf().ip),
+        AAAARecord("orgdns.org", net["orgdns"].defaultIntf().ip6),
+    ]
+    records = [([net["master"], net["slave"]],
+                mydomain_delegation_records
+                + [ARecord("server.mydomain.org",
+                           net["server"].defaultIntf().ip),
+                   AAAARecord("server.mydomain.org",
+                              net["server"].defaultIntf().ip6)]
+                + root_hints),
+               ([net["orgdns"]],
+                org_delegation_records + mydomain_delegation_records
+                + root_hints),
+               ([net['rootdns']], root_hints + org_delegation_records)]
+    for nodes, zone_records in records:
+        for node in nodes:
+            wait_for_dns(node, "localhost", zone_records[0])
+            assert_dns_records(node, "localhost", zone_records)
 
 
 @require_root
 @pytest.mark.parametrize("topo", [
     StaticRoutingNet,
-    DNSNetwork,
-    SimpleBGPTopo
+    DNSNetwork
 ])
-def test_etc_hosts(topo):
-    try:
-        net = IPNet(topo=topo())
-        net.start()
-
-        assert_connectivity(net, v6=True, translate_address=False)
-        assert_connectivity(net, v6=False, translate_address=False)
+def test_etc_hosts(started_net, topo):
+    net = started_net(topo())
 
-        net.stop()
-    finally:
-        cleanup()
+    assert_dual_stack_connectivity(net, translate_address=False)
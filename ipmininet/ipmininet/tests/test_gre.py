@@ -1,6 +1,4 @@
 """This module tests GRE tunnels"""
-import time
-
 from ipmininet.clean import cleanup
 from ipmininet.examples.gre import GRETopo
 from ipmininet.ipnet import IPNet
@@ -13,14 +11,12 @@ def test_gre_example():
         net = IPNet(topo=GRETopo())
         net.start()
 
-        t = 0
-        cmd = "ping -W 1 -c 1 -I 10.0.1.1 10.0.1.2".split(" ")
-        while t < 60 and net["h1"].popen(cmd).wait() != 0:
-            t += 1
-            time.sleep(.5)
+        # A single ping process probes the tunnel every 0.5s
+        # until it gets a reply or the 30s deadline expires
+        cmd = "ping -W 1 -c 1 -w 30 -i 0.5 -I 10.0.1.1 10.0.1.2".split(" ")
         p = net["h1"].popen(cmd)
-        code = p.wait()
         out, err = p.communicate()
+        code = p.returncode
         assert code == 0, "Cannot use GRE tunnel.\nThe command '%s' printed:" \
                           " [stdout]\n%s\n[stderr]\n%s" % (cmd, out, err)
 
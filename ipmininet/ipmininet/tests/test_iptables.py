@@ -1,10 +1,12 @@
 """This module tests iptables"""
+import subprocess
 import time
 
 from ipmininet.clean import cleanup
 from ipmininet.examples.iptables import IPTablesTopo
 from ipmininet.ipnet import IPNet
-from ipmininet.tests.utils import check_tcp_connectivity
+from ipmininet.tests.utils import check_tcp_connectivity, \
+    check_tcp_connectivities
 from . import require_root
 
 
@@ -28,32 +30,28 @@ def test_iptables_example():
         cmd = "ping6 -W 1 -c 1 %s" % ip6
         chk = False
 
+        # The rules apply immediately so start with short delays
+        delay = .25
         for _ in range(attempts):
-            time.sleep(5)
-            p = net["r1"].popen(cmd.split(" "))
+            time.sleep(delay)
+            p = net["r1"].popen(cmd.split(" "), stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
             chk = p.wait() != 0
             if chk:
                 break
+            delay = min(delay * 2, 5)
 
         assert chk, "Pings over IPv6 should be blocked"
 
-        ret, _, _ = check_tcp_connectivity(net["r1"], net["r2"],
-                                           server_port=80,
-                                           server_itf=net["r2"].intf("r2-eth0"),
-                                           timeout=.5)
-        assert ret != 0, "TCP over port 80 should be blocked over IPv4"
-
-        ret, _, _ = check_tcp_connectivity(net["r1"], net["r2"],
-                                           server_port=1480,
-                                           server_itf=net["r2"].intf("r2-eth0"),
-                                           timeout=.5)
-        assert ret != 0, "TCP over port 1480 should be blocked over IPv4"
-
-        ret, _, _ = check_tcp_connectivity(net["r1"], net["r2"],
-                                           server_port=2000,
-                                           server_itf=net["r2"].intf("r2-eth0"),
-                                           timeout=.5)
-        assert ret == 0, "TCP over port 2000 should not be blocked over IPv4"
+        results = check_tcp_connectivities(
+            net["r1"], net["r2"], [80, 1480, 2000],
+            server_itf=net["r2"].intf("r2-eth0"), timeout=.5)
+        assert results[80][0] != 0, \
+            "TCP over port 80 should be blocked over IPv4"
+        assert results[1480][0] != 0, \
+            "TCP over port 1480 should be blocked over IPv4"
+        assert results[2000][0] == 0, \
+            "TCP over port 2000 should not be blocked over IPv4"
 
         ret, out, err = \
             check_tcp_connectivity(net["r1"], net["r2"], v6=True,
@@ -4,7 +4,7 @@ from ipaddress import ip_interface
 from ipmininet.clean import cleanup
 from ipmininet.examples.static_address_network import StaticAddressNet
 from ipmininet.ipnet import IPNet
-from ipmininet.link import OrderedAddress
+from ipmininet.link import OrderedAddress, _parse_addresses_json
 from ipmininet.tests import require_root
 
 
@@ -40,6 +40,12 @@ def test_ordered_address(unsorted_list, sorted_list):
     new_list = [ip.with_prefixlen for ip in new_list]
     assert sorted_list == new_list, "The IP list was not sorted correctly"
 
+    keys = [OrderedAddress(ip).sort_key() for ip in unsorted_list]
+    order = sorted(range(len(keys)), key=keys.__getitem__, reverse=True)
+    new_list = [unsorted_list[i].with_prefixlen for i in order]
+    assert sorted_list == new_list, \
+        "The IP list was not sorted correctly by the sort keys"
+
 
 @require_root
 def test_addr_intf():
@@ -68,8 +74,14 @@ def test_addr_intf():
         assert itf.prefixLen == 28,\
             "Cannot update prefix len of an IPv4 address"
 
+        # Check the addresses against a single read of the system state
+        mac, v4, v6 = _parse_addresses_json(
+            net["r1"].cmd("ip -j address show dev r1-eth1"))
+        assert set(itf.ips()) == set(v4) and set(itf.ip6s()) == set(v6),\
+            "The addresses of the interface differ from the ones of the system"
+
         # Check MAC getters
-        assert itf.updateMAC() == itf.updateAddr()[1],\
+        assert itf.updateMAC() == mac,\
             "MAC address obtained through two methods is not identical"
 
         net.stop()
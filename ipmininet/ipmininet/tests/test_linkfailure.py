@@ -6,7 +6,8 @@ from ipmininet.clean import cleanup
 from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from . import require_root
-from .utils import assert_connectivity, assert_node_not_connected
+from .utils import assert_connectivity, assert_node_not_connected, \
+    assert_dual_stack_connectivity
 from ..examples.link_failure import FailureTopo
 
 
@@ -37,87 +38,69 @@ def test_failure_topo():
         cleanup()
 
 
+@pytest.fixture(scope="module")
+def failure_net(request, scoped_net):
+    """A network shared by the failure tests, each test restores the
+    interfaces that it downed"""
+    return scoped_net(request, Topo())
+
+
 @require_root
 @pytest.mark.parametrize("plan", [
     [("r1", "r2")],
     [("h1", "r1")],
     [("r1", "h1"), ("r2", "r1"), ("r2", "h2")],
 ])
-def test_failurePlan(plan):
-    try:
-        net = IPNet(topo=Topo())
-        net.start()
-
-        # Wait for OSPF convergence
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        interface_down = net.runFailurePlan(plan)
+def test_failurePlan(failure_net, plan):
+    net = failure_net
+    # Wait for OSPF convergence or for the restoration of a previous test
+    assert_dual_stack_connectivity(net)
 
+    interface_down = net.runFailurePlan(plan)
+    try:
         # Check failures
         for n1, n2 in plan:
             assert_node_not_connected(src=net[n1], dst=net[n2], v6=False)
             assert_node_not_connected(src=net[n1], dst=net[n2], v6=True)
-
+    finally:
         net.restoreIntfs(interface_down)
 
-        # Check link restoration
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+    # Check link restoration
+    assert_dual_stack_connectivity(net)
 
 
 @require_root
 @pytest.mark.parametrize("downed_links", [1, 2, 3])
-def test_randomFailure(downed_links):
-    try:
-        net = IPNet(topo=Topo())
-        net.start()
-
-        # Wait for OSPF convergence
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        interface_down = net.randomFailure(downed_links)
+def test_randomFailure(failure_net, downed_links):
+    net = failure_net
+    # Wait for OSPF convergence or for the restoration of a previous test
+    assert_dual_stack_connectivity(net)
 
+    interface_down = net.randomFailure(downed_links)
+    try:
         # Check a failure between both hosts
         assert_node_not_connected(src=net["h1"], dst=net["h2"], v6=False)
         assert_node_not_connected(src=net["h1"], dst=net["h2"], v6=True)
-
+    finally:
         net.restoreIntfs(interface_down)
 
-        # Check link restoration
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+    # Check link restoration
+    assert_dual_stack_connectivity(net)
 
 
 @require_root
-def test_randomFailureOnTargetedLink():
-    try:
-        net = IPNet(topo=Topo())
-        net.start()
-
-        # Wait for OSPF convergence
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        itfs = net.randomFailure(1,
-                                 weak_links=[net["r1"].intf("r1-eth0").link])
+def test_randomFailureOnTargetedLink(failure_net):
+    net = failure_net
+    # Wait for OSPF convergence or for the restoration of a previous test
+    assert_dual_stack_connectivity(net)
 
+    itfs = net.randomFailure(1, weak_links=[net["r1"].intf("r1-eth0").link])
+    try:
         # Check a failure between both hosts
         assert_node_not_connected(src=net["h1"], dst=net["h2"], v6=False)
         assert_node_not_connected(src=net["h1"], dst=net["h2"], v6=True)
-
+    finally:
         net.restoreIntfs(itfs)
 
-        # Check link restoration
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+    # Check link restoration
+    assert_dual_stack_connectivity(net)
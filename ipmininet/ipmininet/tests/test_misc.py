@@ -8,7 +8,7 @@ import ipmininet.utils as utils
 from ipmininet.clean import cleanup
 from ipmininet.examples.static_address_network import StaticAddressNet
 from ipmininet.ipnet import IPNet
-from ipmininet.link import _parse_addresses
+from ipmininet.link import _parse_addresses, _parse_addresses_json
 from ipmininet.router.config.utils import ip_statement
 from . import require_root
 
@@ -35,7 +35,9 @@ def test_nested_ip_networks(address):
     ("f000::", 4),
     ("ffff::", 16),
     ("128.0.0.0", 1),
-    ("fe00::", 7)
+    ("fe00::", 7),
+    ("255.255.255.254", 31),
+    ("ffff:ffff:ffff:ffff:ffff:ffff:ffff:fffe", 127)
 ])
 def test_prefix_for_netmask(test_input, expected):
     assert utils.prefix_for_netmask(test_input) == expected
@@ -77,6 +79,18 @@ def test_ip_address_format():
     assert len(out.strip('\n').split('\n')) == (2 + 2 * len(v4) + 2 * len(v6))
 
 
+def test_ip_address_json_format():
+    """
+    Check that the JSON output of ip address is parsed as the text one.
+    """
+    subprocess.call(['ip', 'link', 'set', 'dev', 'lo', 'up'])
+    out = subprocess.check_output(['ip', 'address', 'show', 'dev', 'lo'])\
+        .decode("utf-8")
+    out_json = subprocess.check_output(['ip', '-j', 'address', 'show',
+                                        'dev', 'lo']).decode("utf-8")
+    assert _parse_addresses_json(out_json) == _parse_addresses(out)
+
+
 @pytest.mark.parametrize("cmd,present", [
     ("ls", True),
     ("/bin/sh", True),
@@ -4,7 +4,7 @@ import os
 from ipmininet.clean import cleanup
 from ipmininet.ipnet import IPNet
 from . import require_root
-from .utils import assert_connectivity
+from .utils import assert_connectivity, wait_for_files
 from ..examples.network_capture import NetworkCaptureTopo
 
 
@@ -21,10 +21,10 @@ def test_network_capture_example():
         net = IPNet(topo=NetworkCaptureTopo())
         net.start()
 
-        # Check files existence
-        for file_name in capture_files:
-            assert os.path.exists(file_name), \
-                f"The capture file {file_name} was not created"
+        # Check files existence, the capture processes may still be starting
+        missing = wait_for_files(capture_files)
+        assert not missing, \
+            f"The capture files {missing} were not created"
 
         # Check example connectivity
         assert_connectivity(net, v6=False)
@@ -33,6 +33,16 @@ class SimpleOpenrTopo(IPTopo):
         super().build(*args, **kwargs)
 
 
+def node_path(node, path: str) -> str:
+    """Return the path to access path as seen in the mount namespace of
+    node, without running a command in the node"""
+    return '/proc/{}/root{}'.format(node.pid, path)
+
+
+def node_listdir(node, path: str):
+    return os.listdir(node_path(node, path))
+
+
 @require_root
 def test_openr_connectivity():
     try:
@@ -78,16 +88,15 @@ def test_tmp_isolation():
             assert os.path.isfile(host_file_name)
             assert host_file_base_name in host_tmp_dir_content
             for i in range(1, 5):
-                node_tmp_dir_content = net['r_{}'.format(i)] \
-                                       .cmd('ls {}'.format(tmp_dir)) \
-                                       .split()
+                node_tmp_dir_content = node_listdir(net['r_{}'.format(i)],
+                                                    tmp_dir)
                 assert host_file_base_name not in node_tmp_dir_content
 
         node_file_base_name = str(uuid.uuid1())
         node_file_name = '{}/{}'.format(tmp_dir,
                                         node_file_base_name)
-        net['r_1'].cmd('touch {}'.format(node_file_name))
-        node_tmp_dir_content = net['r_1'].cmd('ls {}'.format(tmp_dir)).split()
+        open(node_path(net['r_1'], node_file_name), 'w').close()
+        node_tmp_dir_content = node_listdir(net['r_1'], tmp_dir)
         host_tmp_dir_content = os.listdir(tmp_dir)
 
         assert node_file_base_name in node_tmp_dir_content
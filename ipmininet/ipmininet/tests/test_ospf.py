@@ -2,14 +2,13 @@
 
 import pytest
 
-from ipmininet.clean import cleanup
 from ipmininet.examples.simple_ospf_network import SimpleOSPFNet
-from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.router.config import OSPF
 from ipmininet.router.config.base import RouterConfig
 from ipmininet.router.config.ospf import OSPFRedistributedRoute
-from ipmininet.tests.utils import assert_connectivity, assert_path
+from ipmininet.tests.utils import assert_connectivity, assert_paths, \
+    assert_cfg_lines
 from . import require_root
 
 
@@ -28,11 +27,12 @@ class MinimalOSPFNet(IPTopo):
         :param link_params: Parameters to set on the link between r1 and r2"""
         self.node_params_r1 = node_params_r1
         self.ospf_params_r1 = ospf_params_r1
-        self.link_params = link_params
-        self.link_params.setdefault("params1", {})\
-            .setdefault("ip", "10.0.0.1/24")
-        self.link_params.setdefault("params2", {})\
-            .setdefault("ip", "10.0.0.2/24")
+        # Copy the parameters instead of filling in the shared dictionaries
+        # of the parametrized tests
+        self.link_params = dict(
+            link_params,
+            params1={"ip": "10.0.0.1/24", **link_params.get("params1", {})},
+            params2={"ip": "10.0.0.2/24", **link_params.get("params2", {})})
         super().__init__(*args, **kwargs)
 
     def build(self, *args, **kwargs):
@@ -61,48 +61,32 @@ class MinimalOSPFNet(IPTopo):
 
 
 @require_root
-def test_ospf_example():
-    try:
-        net = IPNet(topo=SimpleOSPFNet())
-        net.start()
-        assert_connectivity(net)
-        net.stop()
-    finally:
-        cleanup()
-
-
-unit_igp_cost_paths = [
-    ["h1", "r1", "r2", "h2"],
-    ["h2", "r2", "r1", "h1"],
-    ["h1", "r1", "r3", "h3"],
-    ["h3", "r3", "r1", "h1"],
-    ["h2", "r2", "r3", "h3"],
-    ["h3", "r3", "r2", "h2"],
-]
-
-detour_paths = [
-    ["h1", "r1", "r3", "r2", "h2"],
-    ["h2", "r2", "r3", "r1", "h1"],
-    ["h1", "r1", "r3", "h3"],
-    ["h3", "r3", "r1", "h1"],
-    ["h2", "r2", "r3", "h3"],
-    ["h3", "r3", "r2", "h2"],
-]
+def test_ospf_example(started_net):
+    net = started_net(SimpleOSPFNet())
+    assert_connectivity(net)
+
+
+unit_igp_cost_paths = (
+    ("h1", "r1", "r2", "h2"),
+    ("h2", "r2", "r1", "h1"),
+    ("h1", "r1", "r3", "h3"),
+    ("h3", "r3", "r1", "h1"),
+    ("h2", "r2", "r3", "h3"),
+    ("h3", "r3", "r2", "h2"),
+)
+
+detour_paths = (
+    ("h1", "r1", "r3", "r2", "h2"),
+    ("h2", "r2", "r3", "r1", "h1"),
+    ("h1", "r1", "r3", "h3"),
+    ("h3", "r3", "r1", "h1"),
+    ("h2", "r2", "r3", "h3"),
+    ("h3", "r3", "r2", "h2"),
+)
 
 
 @require_root
 @pytest.mark.parametrize("node_params,ospf_params,link_params,exp_cfg,exp_paths", [
-    ({},
-     {},
-     {},
-     ["  network 10.0.0.1/24 area 0.0.0.0",
-      "interface r1-eth0"],
-     unit_igp_cost_paths),
-    ({},
-     {"debug": ["lsa"]},
-     {},
-     ["debug ospf lsa"],
-     unit_igp_cost_paths),
     ({},
      {},
      {"igp_metric": 5},
@@ -118,43 +102,54 @@ detour_paths = [
      {},
      ["  network 127.0.0.1/8 area 1.1.1.1", "  network 10.0.0.1/24 area 0.0.0.0"],
      unit_igp_cost_paths),
-    ({},
-     {},
-     {"params1": {"ospf_priority": 1}},
-     ["  ip ospf priority 1"],
-     unit_igp_cost_paths),
-    ({},
-     {},
-     {"params1": {"ospf_dead_int": "minimal hello-multiplier 2"}},
-     ["  ip ospf dead-interval minimal hello-multiplier 2"],
-     unit_igp_cost_paths),
-    ({},
-     {"redistribute": [OSPFRedistributedRoute("connected", 1, 15),
-                       OSPFRedistributedRoute("static", 2, 50)]},
-     {},
-     ["  redistribute connected metric-type 1 metric 15",
-      "  redistribute static metric-type 2 metric 50"],
-     unit_igp_cost_paths),
-])
-def test_ospf_daemon_params(node_params, ospf_params, link_params, exp_cfg, exp_paths):
-    try:
-        net = IPNet(topo=MinimalOSPFNet(node_params, ospf_params, link_params),
-                    allocate_IPs=False)
-        net.start()
-
-        # Check generated configuration
-        with open("/tmp/ospfd_r1.cfg") as fileobj:
-            cfg = fileobj.readlines()
-            for line in exp_cfg:
-                assert line + "\n" in cfg,\
-                    "Cannot find the line '%s' in the generated " \
-                    "configuration:\n%s" % (line, "".join(cfg))
-
-        # Check reachability and paths
-        assert_connectivity(net)
-        for path in exp_paths:
-            assert_path(net, path)
-
-        net.stop()
-    finally:
-        cleanup()
+], ids=["link_cost", "link_area", "router_area"])
+def test_ospf_daemon_params(started_net, node_params, ospf_params, link_params, exp_cfg, exp_paths):
+    net = started_net(MinimalOSPFNet(node_params, ospf_params, link_params),
+                      allocate_IPs=False)
+
+    # Check generated configuration
+    cfg_path = net["r1"].nconfig.daemon(OSPF).cfg_filename
+    assert_cfg_lines(cfg_path, exp_cfg)
+
+    # The expected paths link every pair of hosts, so checking them also
+    # checks the reachability
+    assert_paths(net, exp_paths)
+
+
+# These parameters do not change the paths, so they are all checked on
+# a single network
+shared_ospf_params_exp_cfg = [
+    "  network 10.0.0.1/24 area 0.0.0.0",
+    "interface r1-eth0",
+    "debug ospf lsa",
+    "  ip ospf priority 1",
+    "  ip ospf dead-interval minimal hello-multiplier 2",
+    "  redistribute connected metric-type 1 metric 15",
+    "  redistribute static metric-type 2 metric 50",
+]
+
+
+@require_root
+class TestOSPFDaemonSharedParams:
+    """All the parameters that keep unit IGP costs are set on a single
+    network shared by all the checks of this class"""
+
+    @pytest.fixture(scope="class")
+    def ospf_net(self, request, scoped_net):
+        ospf_params = {
+            "debug": ["lsa"],
+            "redistribute": [OSPFRedistributedRoute("connected", 1, 15),
+                             OSPFRedistributedRoute("static", 2, 50)]}
+        link_params = {
+            "params1": {"ospf_priority": 1,
+                        "ospf_dead_int": "minimal hello-multiplier 2"}}
+        return scoped_net(request,
+                          MinimalOSPFNet({}, ospf_params, link_params),
+                          allocate_IPs=False)
+
+    def test_ospf_daemon_cfg(self, ospf_net):
+        cfg_path = ospf_net["r1"].nconfig.daemon(OSPF).cfg_filename
+        assert_cfg_lines(cfg_path, shared_ospf_params_exp_cfg)
+
+    def test_ospf_daemon_paths(self, ospf_net):
+        assert_paths(ospf_net, unit_igp_cost_paths)
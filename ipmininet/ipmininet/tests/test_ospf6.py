@@ -1,14 +1,13 @@
 """This module tests the OSPF6 daemon"""
 import pytest
 
-from ipmininet.clean import cleanup
 from ipmininet.examples.simple_ospfv3_network import SimpleOSPFv3Net
-from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.router.config import OSPF6
 from ipmininet.router.config.base import RouterConfig
 from ipmininet.router.config.ospf6 import OSPF6RedistributedRoute
-from ipmininet.tests.utils import assert_connectivity, assert_path
+from ipmininet.tests.utils import assert_connectivity, assert_paths, \
+    assert_cfg_lines
 from . import require_root
 
 
@@ -51,47 +50,32 @@ class MinimalOSPFv3Net(IPTopo):
 
 
 @require_root
-def test_ospf6_example():
-    try:
-        net = IPNet(topo=SimpleOSPFv3Net())
-        net.start()
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
-
-
-unit_igp_cost_paths = [
-    ["h1", "r1", "r2", "h2"],
-    ["h2", "r2", "r1", "h1"],
-    ["h1", "r1", "r3", "h3"],
-    ["h3", "r3", "r1", "h1"],
-    ["h2", "r2", "r3", "h3"],
-    ["h3", "r3", "r2", "h2"],
-]
-
-high_igp_cost_paths = [
-    ["h1", "r1", "r3", "r2", "h2"],
-    ["h2", "r2", "r3", "r1", "h1"],
-    ["h1", "r1", "r3", "h3"],
-    ["h3", "r3", "r1", "h1"],
-    ["h2", "r2", "r3", "h3"],
-    ["h3", "r3", "r2", "h2"],
-]
+def test_ospf6_example(started_net):
+    net = started_net(SimpleOSPFv3Net())
+    assert_connectivity(net, v6=True)
+
+
+unit_igp_cost_paths = (
+    ("h1", "r1", "r2", "h2"),
+    ("h2", "r2", "r1", "h1"),
+    ("h1", "r1", "r3", "h3"),
+    ("h3", "r3", "r1", "h1"),
+    ("h2", "r2", "r3", "h3"),
+    ("h3", "r3", "r2", "h2"),
+)
+
+high_igp_cost_paths = (
+    ("h1", "r1", "r3", "r2", "h2"),
+    ("h2", "r2", "r3", "r1", "h1"),
+    ("h1", "r1", "r3", "h3"),
+    ("h3", "r3", "r1", "h1"),
+    ("h2", "r2", "r3", "h3"),
+    ("h3", "r3", "r2", "h2"),
+)
 
 
 @require_root
 @pytest.mark.parametrize("node_params,ospf6_params,link_params,exp_cfg,exp_paths", [
-    ({},
-     {},
-     {},
-     ["  interface r1-eth0 area 0.0.0.0"],
-     unit_igp_cost_paths),
-    ({},
-     {"debug": ["flooding"]},
-     {},
-     ["debug ospf6 flooding"],
-     unit_igp_cost_paths),
     ({},
      {},
      {"igp_metric": 5},
@@ -107,42 +91,51 @@ high_igp_cost_paths = [
      {},
      ["  interface lo area 1.1.1.1", "  interface r1-eth0 area 0.0.0.0"],
      unit_igp_cost_paths),
-    ({},
-     {},
-     {"params1": {"ospf6_priority": 1}},
-     ["  ipv6 ospf6 priority 1"],
-     unit_igp_cost_paths),
-    ({},
-     {},
-     {"params1": {"ospf_dead_int": "minimal hello-multiplier 2"}},
-     ["  ipv6 ospf6 dead-interval %d" % OSPF6.DEAD_INT],
-     unit_igp_cost_paths),
-    ({},
-     {"redistribute": [OSPF6RedistributedRoute("connected"),
-                       OSPF6RedistributedRoute("static")]},
-     {},
-     ["  redistribute connected",
-      "  redistribute static"],
-     unit_igp_cost_paths),
-])
-def test_ospf6_daemon_params(node_params, ospf6_params, link_params, exp_cfg, exp_paths):
-    try:
-        net = IPNet(topo=MinimalOSPFv3Net(node_params, ospf6_params, link_params))
-        net.start()
-
-        # Check generated configuration
-        with open("/tmp/ospf6d_r1.cfg") as fileobj:
-            cfg = fileobj.readlines()
-            for line in exp_cfg:
-                assert line + "\n" in cfg,\
-                    "Cannot find the line '%s' in the generated" \
-                    " configuration:\n%s" % (line, "".join(cfg))
-
-        # Check reachability
-        assert_connectivity(net, v6=True)
-        for path in exp_paths:
-            assert_path(net, path, v6=True)
-
-        net.stop()
-    finally:
-        cleanup()
+], ids=["link_cost", "link_area", "router_area"])
+def test_ospf6_daemon_params(started_net, node_params, ospf6_params, link_params, exp_cfg, exp_paths):
+    net = started_net(MinimalOSPFv3Net(node_params, ospf6_params, link_params))
+
+    # Check generated configuration
+    cfg_path = net["r1"].nconfig.daemon(OSPF6).cfg_filename
+    assert_cfg_lines(cfg_path, exp_cfg)
+
+    # The expected paths link every pair of hosts, so checking them also
+    # checks the reachability
+    assert_paths(net, exp_paths, v6=True)
+
+
+# These parameters do not change the paths, so they are all checked on
+# a single network
+shared_ospf6_params_exp_cfg = [
+    "  interface r1-eth0 area 0.0.0.0",
+    "debug ospf6 flooding",
+    "  ipv6 ospf6 priority 1",
+    "  ipv6 ospf6 dead-interval %d" % OSPF6.DEAD_INT,
+    "  redistribute connected",
+    "  redistribute static",
+]
+
+
+@require_root
+class TestOSPF6DaemonSharedParams:
+    """All the parameters that keep unit IGP costs are set on a single
+    network shared by all the checks of this class"""
+
+    @pytest.fixture(scope="class")
+    def ospf6_net(self, request, scoped_net):
+        ospf6_params = {
+            "debug": ["flooding"],
+            "redistribute": [OSPF6RedistributedRoute("connected"),
+                             OSPF6RedistributedRoute("static")]}
+        link_params = {
+            "params1": {"ospf6_priority": 1,
+                        "ospf_dead_int": "minimal hello-multiplier 2"}}
+        return scoped_net(request,
+                          MinimalOSPFv3Net({}, ospf6_params, link_params))
+
+    def test_ospf6_daemon_cfg(self, ospf6_net):
+        cfg_path = ospf6_net["r1"].nconfig.daemon(OSPF6).cfg_filename
+        assert_cfg_lines(cfg_path, shared_ospf6_params_exp_cfg)
+
+    def test_ospf6_daemon_paths(self, ospf6_net):
+        assert_paths(ospf6_net, unit_igp_cost_paths, v6=True)
@@ -1,5 +1,7 @@
 """This module tests that we can move physical interface correctly across
 network namespaces, and that their IP addresses are preserved."""
+import os
+
 from ipmininet.iptopo import IPTopo
 from ipmininet.link import _addresses_of
 from ipmininet.ipnet import IPNet
@@ -36,12 +38,15 @@ class LinkTopo(IPTopo):
                          ip_interface('2001:db8:ff::d/48')],
                         ])
 def dummy_interface(request):
-    if itf in ip('link'):
-        ip('link', 'delete', 'dev', itf)
-    ip('link', 'add', 'dev', itf, 'type', 'dummy')
-    ip('link', 'set', 'dev', itf, 'up')
+    # Configure the interface with a single ip process
+    commands = []
+    if os.path.exists('/sys/class/net/%s' % itf):
+        commands.append(['link', 'delete', 'dev', itf])
+    commands.append(['link', 'add', 'dev', itf, 'type', 'dummy'])
+    commands.append(['link', 'set', 'dev', itf, 'up'])
     for addr in request.param:
-        ip('address', 'add', 'dev', itf, addr.compressed)
+        commands.append(['address', 'add', 'dev', itf, addr.compressed])
+    ip_batch(commands)
 
     # Turns out deleting a net ns also deletes dummy interfaces so no need
     # for a finalizer/teardown
@@ -67,11 +72,12 @@ def check_addresses(addr_list, node):
     assert set(v4) == set(addr_list)
 
 
-def ip(*args):
-    cmd = ['ip']
-    cmd.extend(args)
+def ip_batch(commands):
+    """Run several ip commands, given as lists of arguments, in one process"""
+    batch = ''.join(' '.join(args) + '\n' for args in commands)
     try:
-        log.info('Calling: %s', cmd)
-        return check_output(cmd).decode("utf-8")
+        log.info('Calling: ip -batch -\n%s', batch)
+        return check_output(['ip', '-batch', '-'],
+                            input=batch.encode("utf-8")).decode("utf-8")
     except (OSError, CalledProcessError):
         log.error('Command failed!')
@@ -1,21 +1,22 @@
 """This module tests the RADVD daemon"""
 import pytest
 
-from ipmininet.clean import cleanup
 from ipmininet.examples.router_adv_network import RouterAdvNet
-from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.router.config import RADVD, AdvPrefix, AdvRDNSS
-from ipmininet.tests.utils import assert_connectivity
+from ipmininet.tests.utils import assert_connectivity, assert_cfg_lines
 from . import require_root
 
 
 class CustomRouterAdvNet(IPTopo):
     def __init__(self, link_params, *args, **kwargs):
         """:param link_params: Parameters to set on the link between h and r"""
-        self.link_params = link_params
-        self.link_params.setdefault("params1", {})\
-            .setdefault("ip", "2001:1341::1/64")
+        # Copy the parameters instead of filling in the shared dictionaries
+        # of the parametrized tests
+        self.link_params = dict(
+            link_params,
+            params1={"ip": "2001:1341::1/64",
+                     **link_params.get("params1", {})})
         super().__init__(*args, **kwargs)
 
     def build(self, *args, **kwargs):
@@ -35,63 +36,54 @@ class CustomRouterAdvNet(IPTopo):
 
 
 @require_root
-def test_radvd_example():
-    try:
-        net = IPNet(topo=RouterAdvNet(), use_v4=False, use_v6=True,
-                    allocate_IPs=False)
-        net.start()
-        assert_connectivity(net, v6=True)
-        net.stop()
-    finally:
-        cleanup()
+def test_radvd_example(started_net):
+    net = started_net(RouterAdvNet(), use_v4=False, use_v6=True,
+                      allocate_IPs=False)
+    assert_connectivity(net, v6=True)
+
+
+# The router advertisement parameters do not conflict with each other, so
+# they are all checked on a single network
+shared_radvd_params_exp_cfg = [
+    "        prefix 2001:1341::/64",
+    "            AdvValidLifetime 2000;",
+    "            AdvPreferredLifetime 1000;",
+    "        RDNSS 2001:89ab::d {",
+    "            AdvRDNSSLifetime 1000; # in seconds (0 means invalid)",
+]
 
 
 @require_root
-@pytest.mark.parametrize("link_params,expected_cfg", [
-    ({"params1": {"ra": [AdvPrefix("2001:1341::/64", valid_lifetime=2000,
-                                   preferred_lifetime=1000)]}},
-     ["        prefix 2001:1341::/64",
-      "            AdvValidLifetime 2000;",
-      "            AdvPreferredLifetime 1000;"]),
-    ({"params1": {"ra": [AdvPrefix("2001:1341::/64")],
-                  "rdnss": [AdvRDNSS("2001:89ab::d", max_lifetime=1000)]}},
-     ["        RDNSS 2001:89ab::d {",
-      "            AdvRDNSSLifetime 1000; # in seconds (0 means invalid)"])
-])
-def test_radvd_daemon_params(link_params, expected_cfg):
-    try:
-        net = IPNet(topo=CustomRouterAdvNet(link_params), use_v4=False,
-                    use_v6=True, allocate_IPs=False)
-        net.start()
+class TestRADVDDaemonSharedParams:
+    """All the router advertisement parameters are set on a single network
+    shared by all the checks of this class"""
 
-        # Check generated configuration
-        with open("/tmp/radvd_r.cfg") as fileobj:
-            cfg = fileobj.readlines()
-            for line in expected_cfg:
-                assert line + "\n" in cfg,\
-                    "Cannot find the line '%s' in the generated" \
-                    " configuration:\n%s" % (line, "".join(cfg))
+    @pytest.fixture(scope="class")
+    def radvd_net(self, request, scoped_net):
+        link_params = {
+            "params1": {"ra": [AdvPrefix("2001:1341::/64",
+                                         valid_lifetime=2000,
+                                         preferred_lifetime=1000)],
+                        "rdnss": [AdvRDNSS("2001:89ab::d",
+                                           max_lifetime=1000)]}}
+        return scoped_net(request, CustomRouterAdvNet(link_params),
+                          use_v4=False, use_v6=True, allocate_IPs=False)
 
-        # Check reachability
-        assert_connectivity(net, v6=True)
+    def test_radvd_daemon_cfg(self, radvd_net):
+        cfg_path = radvd_net["r"].nconfig.daemon(RADVD).cfg_filename
+        assert_cfg_lines(cfg_path, shared_radvd_params_exp_cfg)
 
-        net.stop()
-    finally:
-        cleanup()
+    def test_radvd_daemon_connectivity(self, radvd_net):
+        assert_connectivity(radvd_net, v6=True)
 
 
 @require_root
-def test_radvd_cleanup():
+def test_radvd_cleanup(started_net):
+    net = started_net(RouterAdvNet(), use_v4=False, use_v6=True,
+                      allocate_IPs=False)
+    net["r"].nconfig.daemon(RADVD).cleanup()
     try:
-        net = IPNet(topo=RouterAdvNet(), use_v4=False, use_v6=True,
-                    allocate_IPs=False)
-        net.start()
         net["r"].nconfig.daemon(RADVD).cleanup()
-        try:
-            net["r"].nconfig.daemon(RADVD).cleanup()
-        except Exception as e:
-            assert False, "An exception '%s' was raised" \
-                          " while cleaning twice RADVD daemon" % e
-        net.stop()
-    finally:
-        cleanup()
+    except Exception as e:
+        assert False, "An exception '%s' was raised" \
+                      " while cleaning twice RADVD daemon" % e
@@ -1,16 +1,16 @@
 """This module tests the RIPng daemon"""
 import time
+from typing import Dict, List
 
 import pytest
 
-from ipmininet.clean import cleanup
 from ipmininet.examples.ripng_network import RIPngNetwork
 from ipmininet.examples.ripng_network_adjust import RIPngNetworkAdjust
 from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.router.config import RIPng
 from ipmininet.router.config.base import RouterConfig
-from ipmininet.tests.utils import assert_connectivity, assert_path,\
+from ipmininet.tests.utils import assert_connectivity, assert_paths,\
     assert_routing_table
 from . import require_root
 
@@ -38,19 +38,14 @@ class MinimalRIPngNet(IPTopo):
         h2 = self.addHost("h2")
         h3 = self.addHost("h3")
 
-        lr1r2 = self.addLink(r1, r2, igp_metric=10)
-        lr1r2[r1].addParams(ip="2042:12::1/64")
-        lr1r2[r2].addParams(ip="2042:12::2/64")
-        lr1r3 = self.addLink(r1, r3)
-        lr1r3[r1].addParams(ip="2042:13::1/64")
-        lr1r3[r3].addParams(ip="2042:13::3/64")
-        lr2r3 = self.addLink(r2, r3)
-        lr2r3[r2].addParams(ip="2042:23::2/64")
-        lr2r3[r3].addParams(ip="2042:23::3/64")
-
-        self.addLink(r1, h1)
-        self.addLink(r2, h2)
-        self.addLink(r3, h3)
+        self.addLinks((r1, r2, {"igp_metric": 10,
+                                "params1": {"ip": "2042:12::1/64"},
+                                "params2": {"ip": "2042:12::2/64"}}),
+                      (r1, r3, {"params1": {"ip": "2042:13::1/64"},
+                                "params2": {"ip": "2042:13::3/64"}}),
+                      (r2, r3, {"params1": {"ip": "2042:23::2/64"},
+                                "params2": {"ip": "2042:23::3/64"}}),
+                      (r1, h1), (r2, h2), (r3, h3))
 
         self.addSubnet(nodes=[r1, h1], subnets=["2042:11::/64"])
         self.addSubnet(nodes=[r2, h2], subnets=["2042:22::/64"])
@@ -73,61 +68,61 @@ class MinimalRIPngNet(IPTopo):
 
 
 expected_paths = {
-    MinimalRIPngNet.__name__: [
-        ['h1', 'r1', 'r3', 'r2', 'h2'],
-        ['h1', 'r1', 'r3', 'h3'],
-        ['h2', 'r2', 'r3', 'r1', 'h1'],
-        ['h2', 'r2', 'r3', 'h3'],
-        ['h3', 'r3', 'r1', 'h1'],
-        ['h3', 'r3', 'r2', 'h2']
-    ],
-    RIPngNetwork.__name__: [
-        ['h1', 'r1', 'r2', 'r3', 'h3'],
-        ['h1', 'r1', 'r4', 'h4'],
-        ['h1', 'r1', 'r4', 'r5', 'h5'],
-
-        ['h3', 'r3', 'r2', 'r1', 'h1'],
-        ['h3', 'r3', 'r2', 'r5', 'r4', 'h4'],
-        ['h3', 'r3', 'r2', 'r5', 'h5'],
-
-        ['h4', 'r4', 'r1', 'h1'],
-        ['h4', 'r4', 'r5', 'r2', 'r3', 'h3'],
-        ['h4', 'r4', 'r5', 'h5'],
-
-        ['h5', 'r5', 'r4', 'r1', 'h1'],
-        ['h5', 'r5', 'r2', 'r3', 'h3'],
-        ['h5', 'r5', 'r4', 'h4']
-    ],
-    RIPngNetworkAdjust.__name__: [
-        ['h1', 'r1', 'r3', 'h3'],
-        ['h1', 'r1', 'r5', 'h5'],
-
-        ['h3', 'r3', 'r1', 'h1'],
-        ['h3', 'r3', 'r2', 'r4', 'h4'],
-
-        ['h4', 'r4', 'r2', 'r3', 'h3'],
-        ['h4', 'r4', 'r5', 'h5'],
-
-        ['h5', 'r5', 'r1', 'h1'],
-        ['h5', 'r5', 'r4', 'h4']
-    ],
-    "RIPngNetworkAdjust-mod": [
-        ['h1', 'r1', 'r3', 'h3'],
-        ['h1', 'r1', 'r2', 'r4', 'h4'],
-        ['h1', 'r1', 'r2', 'r5', 'h5'],
-
-        ['h3', 'r3', 'r1', 'h1'],
-        ['h3', 'r3', 'r2', 'r4', 'h4'],
-        ['h3', 'r3', 'r2', 'r5', 'h5'],
-
-        ['h4', 'r4', 'r2', 'r3', 'h3'],
-        ['h4', 'r4', 'r2', 'r3', 'h3'],
-        ['h4', 'r4', 'r5', 'h5'],
-
-        ['h5', 'r5', 'r2', 'r1', 'h1'],
-        ['h5', 'r5', 'r2', 'r3', 'h3'],
-        ['h5', 'r5', 'r4', 'h4']
-    ]
+    MinimalRIPngNet.__name__: (
+        ('h1', 'r1', 'r3', 'r2', 'h2'),
+        ('h1', 'r1', 'r3', 'h3'),
+        ('h2', 'r2', 'r3', 'r1', 'h1'),
+        ('h2', 'r2', 'r3', 'h3'),
+        ('h3', 'r3', 'r1', 'h1'),
+        ('h3', 'r3', 'r2', 'h2')
+    ),
+    RIPngNetwork.__name__: (
+        ('h1', 'r1', 'r2', 'r3', 'h3'),
+        ('h1', 'r1', 'r4', 'h4'),
+        ('h1', 'r1', 'r4', 'r5', 'h5'),
+
+        ('h3', 'r3', 'r2', 'r1', 'h1'),
+        ('h3', 'r3', 'r2', 'r5', 'r4', 'h4'),
+        ('h3', 'r3', 'r2', 'r5', 'h5'),
+
+        ('h4', 'r4', 'r1', 'h1'),
+        ('h4', 'r4', 'r5', 'r2', 'r3', 'h3'),
+        ('h4', 'r4', 'r5', 'h5'),
+
+        ('h5', 'r5', 'r4', 'r1', 'h1'),
+        ('h5', 'r5', 'r2', 'r3', 'h3'),
+        ('h5', 'r5', 'r4', 'h4')
+    ),
+    RIPngNetworkAdjust.__name__: (
+        ('h1', 'r1', 'r3', 'h3'),
+        ('h1', 'r1', 'r5', 'h5'),
+
+        ('h3', 'r3', 'r1', 'h1'),
+        ('h3', 'r3', 'r2', 'r4', 'h4'),
+
+        ('h4', 'r4', 'r2', 'r3', 'h3'),
+        ('h4', 'r4', 'r5', 'h5'),
+
+        ('h5', 'r5', 'r1', 'h1'),
+        ('h5', 'r5', 'r4', 'h4')
+    ),
+    "RIPngNetworkAdjust-mod": (
+        ('h1', 'r1', 'r3', 'h3'),
+        ('h1', 'r1', 'r2', 'r4', 'h4'),
+        ('h1', 'r1', 'r2', 'r5', 'h5'),
+
+        ('h3', 'r3', 'r1', 'h1'),
+        ('h3', 'r3', 'r2', 'r4', 'h4'),
+        ('h3', 'r3', 'r2', 'r5', 'h5'),
+
+        ('h4', 'r4', 'r2', 'r3', 'h3'),
+        ('h4', 'r4', 'r2', 'r3', 'h3'),
+        ('h4', 'r4', 'r5', 'h5'),
+
+        ('h5', 'r5', 'r2', 'r1', 'h1'),
+        ('h5', 'r5', 'r2', 'r3', 'h3'),
+        ('h5', 'r5', 'r4', 'h4')
+    )
 }
 
 
@@ -137,47 +132,53 @@ expected_paths = {
     RIPngNetwork,
     RIPngNetworkAdjust
 ])
-def test_ripng_examples(topo):
-    try:
-        net = IPNet(topo=topo())
-        net.start()
-        assert_connectivity(net, v6=True)
-        for path in expected_paths[topo.__name__]:
-            assert_path(net, path, v6=True)
-
-        net.stop()
-    finally:
-        cleanup()
+def test_ripng_examples(started_net, topo):
+    net = started_net(topo())
+    assert_connectivity(net, v6=True)
+    assert_paths(net, expected_paths[topo.__name__], v6=True)
 
 
 @require_root
-def test_ripng_adjust():
-    try:
-        net = IPNet(topo=RIPngNetworkAdjust(lr1r5_cost=5))
-        net.start()
-        assert_connectivity(net, v6=True)
-        for path in expected_paths["RIPngNetworkAdjust-mod"]:
-            assert_path(net, path, v6=True)
-
-        net.stop()
-    finally:
-        cleanup()
+def test_ripng_adjust(started_net):
+    net = started_net(RIPngNetworkAdjust(lr1r5_cost=5))
+    assert_connectivity(net, v6=True)
+    assert_paths(net, expected_paths["RIPngNetworkAdjust-mod"], v6=True)
+
+
+def wait_for_learned_routes(net: IPNet, routing_tables: Dict[str, List[str]],
+                            timeout=10, interval=.2):
+    """Wait until each router has installed all its expected prefixes,
+    possibly at different times as they may be flushed quickly.
+
+    This is only a best effort: routes learned and flushed while the network
+    was starting, or between two polls, cannot be observed. The wait then
+    ends after timeout seconds, as the previous fixed sleep did."""
+    learned = {router: set() for router in routing_tables}
+    deadline = time.time() + timeout
+    while True:
+        for router, prefixes in routing_tables.items():
+            out = net[router].cmd("ip -6 route")
+            learned[router].update(p for p in prefixes if p in out)
+        missing = {router: set(prefixes) - learned[router]
+                   for router, prefixes in routing_tables.items()
+                   if set(prefixes) - learned[router]}
+        if not missing or time.time() >= deadline:
+            break
+        time.sleep(interval)
 
 
 @require_root
-def test_ripng_flush_routing_tables():
-    try:
-        net = IPNet(topo=MinimalRIPngNet(is_test_flush=True))
-        net.start()
-        time.sleep(10)
-
-        routing_tables = {
-            "r1": ["2042:22::/64", "2042:33::/64", "2042:23::/64"],
-            "r2": ["2042:11::/64", "2042:33::/64", "2042:13::/64"],
-            "r3": ["2042:11::/64", "2042:22::/64", "2042:12::/64"]
-        }
-        for router, expected_ipv6 in routing_tables.items():
-            assert_routing_table(net[router], expected_ipv6)
-        net.stop()
-    finally:
-        cleanup()
+def test_ripng_flush_routing_tables(started_net):
+    net = started_net(MinimalRIPngNet(is_test_flush=True))
+
+    routing_tables = {
+        "r1": ["2042:22::/64", "2042:33::/64", "2042:23::/64"],
+        "r2": ["2042:11::/64", "2042:33::/64", "2042:13::/64"],
+        "r3": ["2042:11::/64", "2042:22::/64", "2042:12::/64"]
+    }
+    # No update follows the routes learned at startup, so they are
+    # flushed timeout_timer + garbage_timer seconds after being learned.
+    # The flush itself is what the test checks.
+    wait_for_learned_routes(net, routing_tables)
+    for router, expected_ipv6 in routing_tables.items():
+        assert_routing_table(net[router], expected_ipv6)
@@ -1,8 +1,14 @@
+import heapq
+import json
+import math
+import os
 import shlex
 import signal
 import time
 import traceback
-from typing import Dict, List, Tuple
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import pytest
 
@@ -13,11 +19,23 @@ from ipmininet.srv6 import LocalSIDTable, SRv6EndFunction, SRv6EndXFunction, \
     SRv6EndTFunction, SRv6EndDX6Function, SRv6Encap, SRv6EndDT6Function, \
     SRv6EndB6EncapsFunction
 from ipmininet.tests import require_root
-from ipmininet.tests.utils import assert_connectivity, assert_path
+from ipmininet.tests.utils import assert_connectivity, assert_path, \
+    wait_for_files
 from ipmininet.utils import require_cmd
 
 MAIN_TABLE = 254
 
+# The echo requests may be behind a segment routing header or encapsulated
+# in another IPv6 header, where the BPF cannot find their ICMPv6 type. So
+# the filter only drops OSPFv3 and the ICMPv6 packets directly following
+# the IPv6 header that are not echo requests, e.g., the neighbor discovery.
+CAPTURE_FILTER = "ip6 and not ip6 proto 89" \
+                 " and not (icmp6 and ip6[40] != 128)"
+# Keep the captures in memory when possible
+CAPTURE_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp"
+# Whether ping accepts a fractional -W, probed on its first use
+_fractional_ping_timeout = None  # type: Optional[bool]
+
 
 class SRv6TestTopo(SRv6Topo):
 
@@ -51,90 +69,159 @@ class SRv6TestTopo(SRv6Topo):
                 raise e
 
 
+# The addresses of the nodes of each network, kept across the retries
+# and dropped with the network
+_node_ip6s = weakref.WeakKeyDictionary()
+_default_ip6s = weakref.WeakKeyDictionary()
+
+
+def node_ip6s(net: IPNet, name: str) -> Tuple[str, ...]:
+    """
+    Return the global IPv6 addresses of a node
+
+    :param net: The network
+    :param name: The name of the node or an IPv6 address
+    :return: The addresses of the node or the address itself if there is
+             no node with this name
+    """
+    ips = _node_ip6s.setdefault(net, {})
+    if name not in ips:
+        try:
+            ips[name] = tuple(ip.ip.compressed
+                              for itf in net[name].intfList()
+                              for ip in itf.ip6s(exclude_lls=True))
+        except KeyError:
+            ips[name] = (name,)
+    return ips[name]
+
+
+def default_ip6s(net: IPNet) -> Dict[str, str]:
+    """
+    Return the IPv6 address of the default interface of each node
+
+    :param net: The network
+    :return: A dictionary mapping the node names to their address
+    """
+    ips = _default_ip6s.get(net)
+    if ips is None:
+        ips = _default_ip6s[net] = {n.name: n.intf().ip6
+                                    for n in net.routers + net.hosts}
+    return ips
+
+
+def wait_for_stable_sizes(paths: List[str], period=.1, timeout=1.):
+    """
+    Wait until the sizes of files stop growing
+
+    :param paths: The paths of the files
+    :param period: Time during which the sizes must not change
+    :param timeout: Maximum time to wait
+    """
+    deadline = time.time() + timeout
+    sizes = [os.path.getsize(path) for path in paths]
+    while time.time() < deadline:
+        time.sleep(period)
+        new_sizes = [os.path.getsize(path) for path in paths]
+        if new_sizes == sizes:
+            return
+        sizes = new_sizes
+
+
+def ping_timeout(node, timeout: float) -> str:
+    """Return the -W argument of ping for this timeout. Older iputils only
+    parse an integer number of seconds, the timeout is then rounded up."""
+    global _fractional_ping_timeout
+    if _fractional_ping_timeout is None:
+        # Older versions reject the argument before sending anything
+        out = node.cmd(shlex.split("ping -6 -n -c 1 -W 0.5 ::1"))
+        _fractional_ping_timeout = "bad linger time" not in out \
+            and "invalid argument" not in out
+    if _fractional_ping_timeout:
+        return "%g" % timeout
+    return str(max(1, int(math.ceil(timeout))))
+
+
 def sr_path(net: IPNet, src: str, dst_ip: str, timeout=1, through=()) \
         -> List[str]:
-    require_cmd("tshark", help_str="tshark is required to run tests")
-    require_cmd("nmap", help_str="nmap is required to run tests")
+    ping_cmd = "ping -6 -n -c 1 -W %s %s" % (ping_timeout(net[src], timeout),
+                                              dst_ip)
 
-    # Check connectivity
-    ping_cmd = "ping -6 -c 1 -W %d %s" % (int(timeout), dst_ip)
-    out = net[src].cmd(shlex.split(ping_cmd))
-    if ", 0% packet loss" not in out:
-        return []
-
-    # Start captures of SYN packets to port 80
-    tsharks = []
+    # Start captures of IPv6 packets. Each node lives in its own network
+    # namespace so that a capture in the root namespace would not see them.
+    # dumpcap only captures, it does not load the dissectors like tshark.
+    # The snapshot length keeps the IPv6 headers, the SRH and the ICMPv6 header
+    nodes = net.routers + net.hosts
+    pcaps = [os.path.join(CAPTURE_DIR, "{}.pcap".format(n.name))
+             for n in nodes]
+    for pcap in pcaps:
+        try:
+            os.unlink(pcap)  # Remove the capture of a previous attempt
+        except FileNotFoundError:
+            pass
+    dumpcaps = []
     try:
-        for n in net.routers + net.hosts:
-            p = n.popen(shlex.split("tshark -n -i any -f 'ip6'"
-                                    " -w /tmp/{}.pcap".format(n.name)))
-            tsharks.append(p)
-        time.sleep(15)  # Wait for tshark to start
+        for n, pcap in zip(nodes, pcaps):
+            p = n.popen(shlex.split("dumpcap -q -i any -s 256"
+                                    " -f '{}' -w {}".format(CAPTURE_FILTER,
+                                                            pcap)))
+            dumpcaps.append(p)
+        # dumpcap only creates its output file once the capture is started
+        missing = wait_for_files(pcaps, timeout=15)
+        assert not missing, "dumpcap did not start the captures %s" % missing
 
-        # Launch ping
+        # Launch a single ping, it also checks the connectivity. Without
+        # a reply, the path cannot be inferred and assert_path() retries.
         out = net[src].cmd(shlex.split(ping_cmd))
-        assert "100% packet loss" not in out, \
-            "Connectivity from %s to %s is not ensured," \
-            " so we cannot infer the path." % (src, dst_ip)
-        time.sleep(1)  # Wait for tshark to register the info
+        if ", 0% packet loss" not in out:
+            return []
+        wait_for_stable_sizes(pcaps)  # Wait for dumpcap to register the info
 
-        for p in tsharks:
-            assert p.poll() is None, "tshark stopped unexpectedly:" \
+        for p in dumpcaps:
+            assert p.poll() is None, "dumpcap stopped unexpectedly:" \
                                      "stderr '{}'".format(p.stderr.read())
     finally:
         # Stop captures
-        for p in tsharks:
+        for p in dumpcaps:
             p.send_signal(signal.SIGINT)
             p.wait()
 
     # Retrieve packet captures
-    captures = {}  # type: Dict[str, List[Tuple[float, str]]]
-    for n in net.routers + net.hosts:
-        out = n.cmd(shlex.split("tshark -n -r /tmp/{}.pcap -T fields "
-                                "-E separator=, "
-                                "-e icmpv6.type -e ipv6.dst -e frame.time_epoch"
-                                .format(n.name)))
-        data = out.split("\n")[1:-1]
-        for line in data:
-            values = line.strip().split(",")
-            if len(values) < 3:
-                continue
-            icmp_type = values[0]
-            data_dst = values[1]
-            data_time = values[-1]
-            if icmp_type == "128":
-                captures.setdefault(n.name, []) \
-                    .append((float(data_time), data_dst))
+    def decode(n, pcap: str) -> List[Tuple[float, str, str]]:
+        # Only the echo requests are decoded and only the two fields
+        # that we need are exported
+        p = n.popen(shlex.split("tshark -n -r {} -T json"
+                                " -Y 'icmpv6.type == 128'"
+                                " -e ipv6.dst -e frame.time_epoch"
+                                .format(pcap)),
+                    universal_newlines=True)
+        out, _ = p.communicate()
+        # The first address is the destination of the outer header.
+        # The capture of "any" interface is nearly but not strictly
+        # chronological, so the few packets of the node are sorted.
+        return sorted((float(packet["_source"]["layers"]
+                             ["frame.time_epoch"][0]),
+                       packet["_source"]["layers"]["ipv6.dst"][0], n.name)
+                      for packet in json.loads(out or "[]"))
 
-    # Analyze results
+    # The decodes are independent processes, so they run concurrently
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        captures = list(executor.map(decode, nodes, pcaps))
 
-    packet_received = {}  # type: Dict[str, List[Tuple[float, str]]]
-    for n, packets in captures.items():
-        for data_time, destination in packets:
-            packet_received.setdefault(destination, []).append((data_time, n))
+    # Analyze results
 
+    # Follow each destination through the nodes in the order of reception
     sub_paths = {}  # type: Dict[str, List[str]]
-    for dest in packet_received:
-        ordered_reception = sorted(packet_received[dest])
-
-        sub_paths[dest] = []
-        for _, n in ordered_reception:
-            if len(sub_paths[dest]) == 0 or sub_paths[dest][-1] != n:
-                sub_paths[dest].append(n)
+    for _, dest, n in heapq.merge(*captures):
+        sub_path = sub_paths.setdefault(dest, [])
+        if len(sub_path) == 0 or sub_path[-1] != n:
+            sub_path.append(n)
 
     # Order sub paths with the trough list
     path = []  # type: List[str]
     for intermediate in through:
         found = False
 
-        try:
-            intermediate_ips = [ip.ip.compressed
-                                for itf in net[intermediate].intfList()
-                                for ip in itf.ip6s(exclude_lls=True)]
-        except KeyError:
-            intermediate_ips = [intermediate]
-
-        for ip in intermediate_ips:
+        for ip in node_ip6s(net, intermediate):
             if ip in sub_paths:
                 found = True
                 path.extend(sub_paths[ip])
@@ -150,7 +237,8 @@ def sr_path(net: IPNet, src: str, dst_ip: str, timeout=1, through=()) \
             compressed_path.append(n)
 
     # Remove source to get a similar output to traceroute
-    path = [net[n].intf().ip6 for n in compressed_path][1:]
+    ip6s = default_ip6s(net)
+    path = [ip6s[n] for n in compressed_path][1:]
     return path
 
 
@@ -239,6 +327,9 @@ def sr_path(net: IPNet, src: str, dst_ip: str, timeout=1, through=()) \
     )
 ])
 def test_static_examples(routes, paths, through):
+    # Checked once here rather than in each of the sr_path retries
+    require_cmd("dumpcap", help_str="dumpcap is required to run tests")
+    require_cmd("tshark", help_str="tshark is required to run tests")
     try:
         topo = SRv6TestTopo(new_routes=routes)
         net = IPNet(topo=topo)
@@ -247,7 +338,7 @@ def test_static_examples(routes, paths, through):
         assert_connectivity(net, v6=False)
         for i, p in enumerate(paths):
             assert_path(net, p, v6=True, traceroute_fun=sr_path,
-                        through=through[i], timeout=1, retry=30)
+                        through=through[i], timeout=.5, retry=30)
 
         topo.clean()
         net.stop()
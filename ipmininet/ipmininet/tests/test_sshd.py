@@ -1,10 +1,13 @@
 """This module tests the SSH daemon"""
 import os
+import subprocess
 import time
+from typing import Tuple
 
 from ipmininet.clean import cleanup
 from ipmininet.examples.sshd import SSHTopo
 from ipmininet.ipnet import IPNet
+from ipmininet.tests.utils import wait_for_listening_port
 from . import require_root
 
 
@@ -26,12 +29,23 @@ def test_sshd_example():
         ip = net["r2"].intf("r2-eth0").ip
         cmd = "ssh -oStrictHostKeyChecking=no -oConnectTimeout=1" \
               " -oPasswordAuthentication=no -i %s %s ls" % (ssh_key, ip)
-        t = 0
-        while t < 60 and net["r1"].popen(cmd.split(" ")).wait() != 0:
+
+        def ssh() -> Tuple[int, str]:
+            p = net["r1"].popen(cmd.split(" "), stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+            err = p.communicate()[1]
+            return p.returncode, err
+
+        assert wait_for_listening_port(net["r2"], 22), \
+            "The SSH daemon of r2 does not listen on port 22"
+        # sshd may still refuse the key right after binding its socket
+        for _ in range(10):
+            code, err = ssh()
+            if code == 0:
+                break
             time.sleep(0.5)
-            t += 1
-        p = net["r1"].popen(cmd.split(" "))
-        assert p.wait() == 0, "Cannot connect with SSH to the router"
+        assert code == 0, "Cannot connect with SSH to the router: %s" % err
 
         net.stop()
     finally:
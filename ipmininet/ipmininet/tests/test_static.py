@@ -1,4 +1,6 @@
 """This module tests the static address and route allocations"""
+from types import MappingProxyType
+
 import pytest
 
 from ipmininet.clean import cleanup
@@ -12,7 +14,8 @@ from ipmininet.examples.static_routing_network_basic import \
 from ipmininet.examples.static_routing_network_complex import \
     StaticRoutingNetComplex
 from ipmininet.ipnet import IPNet
-from ipmininet.tests.utils import assert_connectivity, assert_path
+from ipmininet.tests.utils import assert_connectivity, assert_paths, \
+    assert_dual_stack_connectivity
 from . import require_root
 
 
@@ -52,8 +55,7 @@ def test_static_example():
         assert net["r2"].intf("r2-eth1").ip6 == "2001:3c::1"
 
         # Check connectivity
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
+        assert_dual_stack_connectivity(net)
 
         net.stop()
     finally:
@@ -80,58 +82,57 @@ def test_partial_static_example():
         assert net["r2"].intf("r2-eth1").ip6 == "fc00:1::1"
 
         # Check connectivity
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
+        assert_dual_stack_connectivity(net)
 
         net.stop()
     finally:
         cleanup()
 
 
-static_paths = {
-
-    StaticRoutingNet.__name__: [
-        ["h1", "r1", "r2", "h2"],
-        ["h2", "r2", "r1", "h1"]
-    ],
-    StaticRoutingNetFailure.__name__: [
-        ["h4", "r4", "r3", "h3"]
-    ],
-    StaticRoutingNetBasic.__name__: [
-        ["h1", "r1", "r2", "h2"],
-        ["h1", "r1", "r3", "h3"],
-        ["h1", "r1", "r3", "r4", "h4"],
-
-        ["h2", "r2", "r1", "h1"],
-        ["h2", "r2", "r4", "r1", "r3", "h3"],
-        ["h2", "r2", "r4", "h4"],
-
-        ["h3", "r3", "r4", "r1", "h1"],
-        ["h3", "r3", "r4", "r2", "h2"],
-        ["h3", "r3", "r4", "h4"],
-
-        ["h4", "r4", "r1", "h1"],
-        ["h4", "r4", "r2", "h2"],
-        ["h4", "r4", "r1", "r3", "h3"]
-    ],
-    StaticRoutingNetComplex.__name__: [
-        ["h1", "r1", "r2", "r5", "r4", "r3", "h3"],
-        ["h1", "r1", "r2", "r5", "r4", "h4"],
-        ["h1", "r1", "r2", "r5", "r6", "h6"],
-
-        ["h3", "r3", "r2", "r1", "h1"],
-        ["h3", "r3", "r2", "r5", "r4", "h4"],
-        ["h3", "r3", "r2", "r5", "r6", "h6"],
-
-        ["h4", "r4", "r3", "r2", "r1", "h1"],
-        ["h4", "r4", "r3", "h3"],
-        ["h4", "r4", "r3", "r2", "r5", "r6", "h6"],
-
-        ["h6", "r6", "r1", "h1"],
-        ["h6", "r6", "r5", "r4", "r3", "h3"],
-        ["h6", "r6", "r5", "r4", "h4"],
-    ]
-}
+static_paths = MappingProxyType({
+
+    StaticRoutingNet.__name__: (
+        ("h1", "r1", "r2", "h2"),
+        ("h2", "r2", "r1", "h1")
+    ),
+    StaticRoutingNetFailure.__name__: (
+        ("h4", "r4", "r3", "h3"),
+    ),
+    StaticRoutingNetBasic.__name__: (
+        ("h1", "r1", "r2", "h2"),
+        ("h1", "r1", "r3", "h3"),
+        ("h1", "r1", "r3", "r4", "h4"),
+
+        ("h2", "r2", "r1", "h1"),
+        ("h2", "r2", "r4", "r1", "r3", "h3"),
+        ("h2", "r2", "r4", "h4"),
+
+        ("h3", "r3", "r4", "r1", "h1"),
+        ("h3", "r3", "r4", "r2", "h2"),
+        ("h3", "r3", "r4", "h4"),
+
+        ("h4", "r4", "r1", "h1"),
+        ("h4", "r4", "r2", "h2"),
+        ("h4", "r4", "r1", "r3", "h3")
+    ),
+    StaticRoutingNetComplex.__name__: (
+        ("h1", "r1", "r2", "r5", "r4", "r3", "h3"),
+        ("h1", "r1", "r2", "r5", "r4", "h4"),
+        ("h1", "r1", "r2", "r5", "r6", "h6"),
+
+        ("h3", "r3", "r2", "r1", "h1"),
+        ("h3", "r3", "r2", "r5", "r4", "h4"),
+        ("h3", "r3", "r2", "r5", "r6", "h6"),
+
+        ("h4", "r4", "r3", "r2", "r1", "h1"),
+        ("h4", "r4", "r3", "h3"),
+        ("h4", "r4", "r3", "r2", "r5", "r6", "h6"),
+
+        ("h6", "r6", "r1", "h1"),
+        ("h6", "r6", "r5", "r4", "r3", "h3"),
+        ("h6", "r6", "r5", "r4", "h4"),
+    )
+})
 
 
 @require_root
@@ -146,16 +147,15 @@ def test_static_examples(topo, connected, v4, v6):
         net = IPNet(topo=topo())
         net.start()
 
-        if connected and v4:
-            assert_connectivity(net, v6=False)
-        if connected and v6:
-            assert_connectivity(net, v6=True)
+        if connected and v4 and v6:
+            assert_dual_stack_connectivity(net)
+        elif connected and (v4 or v6):
+            assert_connectivity(net, v6=v6)
 
-        for p in static_paths[topo.__name__]:
-            if v4:
-                assert_path(net, p, v6=False)
-            if v6:
-                assert_path(net, p, v6=True)
+        if v4:
+            assert_paths(net, static_paths[topo.__name__], v6=False)
+        if v6:
+            assert_paths(net, static_paths[topo.__name__], v6=True)
 
         net.stop()
     finally:
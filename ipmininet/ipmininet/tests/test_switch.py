@@ -1,4 +1,5 @@
 """This module tests the switches, hubs and STP"""
+from types import MappingProxyType
 
 import pytest
 
@@ -14,7 +15,8 @@ from ipmininet.examples.spanning_tree_cost import SpanningTreeCost
 from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.tests import require_root
-from ipmininet.tests.utils import assert_stp_state, assert_connectivity
+from ipmininet.tests.utils import assert_stp_state, \
+    assert_dual_stack_connectivity
 
 
 class SimpleSpanningTree(IPTopo):
@@ -58,7 +60,7 @@ class SimpleSpanningTree(IPTopo):
         super().build(*args, **kwargs)
 
 
-expected_states = {
+expected_states = MappingProxyType({
     SimpleSpanningTree.__name__: {
         "s1": {"s1-eth1": "forwarding", "s1-eth2": "forwarding",
                "s1-eth3": "forwarding"},
@@ -141,33 +143,36 @@ expected_states = {
         "s2": {"s2-eth1": "forwarding", "s2-eth2": "forwarding"},
         "s3": {"s3-eth1": "forwarding", "s3-eth2": "blocking"}
     }
-}
+})
 
 
 @require_root
-@pytest.mark.parametrize("topo", [
-    SimpleSpanningTree,
-    SpanningTreeNet,
-    SpanningTreeAdjust,
-    SpanningTreeBus,
-    SpanningTreeFullMesh,
-    SpanningTreeHub,
-    SpanningTreeIntermediate,
-    SpanningTreeCost
-])
-def test_stp(topo):
-    try:
-        net = IPNet(topo=topo())
-        net.start()
-
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        for switch, states in expected_states[topo.__name__].items():
-            assert_stp_state(net[switch], states)
-        net.stop()
-    finally:
-        cleanup()
+class TestSTP:
+    """Each topology starts a single network shared by all the checks of
+    this class"""
+
+    @pytest.fixture(scope="class", params=[
+        SimpleSpanningTree,
+        SpanningTreeNet,
+        SpanningTreeAdjust,
+        SpanningTreeBus,
+        SpanningTreeFullMesh,
+        SpanningTreeHub,
+        SpanningTreeIntermediate,
+        SpanningTreeCost
+    ], ids=lambda topo: topo.__name__)
+    def stp_net(self, request, scoped_net):
+        net = scoped_net(request, request.param())
+        return net, expected_states[request.param.__name__]
+
+    def test_stp_connectivity(self, stp_net):
+        net, _ = stp_net
+        assert_dual_stack_connectivity(net)
+
+    def test_stp_state(self, stp_net):
+        net, states = stp_net
+        for switch, switch_states in states.items():
+            assert_stp_state(net[switch], switch_states)
 
 
 def test_stp_adjust():
@@ -178,8 +183,7 @@ def test_stp_adjust():
                                             l2_end="s3-eth1", l2_cost=3))
         net.start()
 
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
+        assert_dual_stack_connectivity(net)
 
         for switch, states in expected_states["SpanningTreeAdjust-mod"].items():
             assert_stp_state(net[switch], states)
@@ -2,7 +2,7 @@
 import json
 import re
 import subprocess
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
@@ -11,7 +11,8 @@ from ipmininet.examples.tc_advanced_network import TCAdvancedNet
 from ipmininet.examples.tc_network import TCNet
 from ipmininet.ipnet import IPNet
 from ipmininet.router import IPNode
-from ipmininet.tests.utils import assert_connectivity
+from ipmininet.tests.utils import assert_dual_stack_connectivity, \
+    wait_for_listening_port
 from . import require_root
 from .utils import require_cmd
 
@@ -32,13 +33,8 @@ def assert_delay(src: IPNode, dst: IPNode, delay_target: float, tolerance=1.5,
     assert exitcode == 0, "Cannot ping between {src} and {dst}: " \
                           "{err}".format(src=src, dst=dst, err=err)
 
-    delays = []
-    for line in out.split("\n"):
-        match = delay_regex.search(line)
-        if match is not None:
-            delay = float(match.group(1))
-            if delay_target - tolerance <= delay <= delay_target + tolerance:
-                delays.append(delay)
+    delays = [delay for delay in map(float, delay_regex.findall(out))
+              if delay_target - tolerance <= delay <= delay_target + tolerance]
     assert len(delays) >= 5, \
         "Less than half of the pings between {src} and {dst}" \
         " had the desired latency".format(src=src, dst=dst)
@@ -49,7 +45,9 @@ def assert_bw(src: IPNode, dst: IPNode, bw_target: float, tolerance=1,
     require_cmd("iperf3", help_str="iperf3 is required to run tests")
 
     iperf = dst.popen("iperf3 -s -J --one-off", universal_newlines=True)
-    time.sleep(1)
+    # A connection would be the one-off test, so the socket is only looked up
+    assert wait_for_listening_port(dst, 5201, timeout=10), \
+        "The iperf3 server of {dst} does not listen".format(dst=dst)
     dst_ip = dst.intf().ip6 if v6 else dst.intf().ip
     src.popen("iperf3 -c {}".format(dst_ip), stdout=subprocess.DEVNULL,
               stderr=subprocess.DEVNULL)
@@ -85,14 +83,18 @@ def test_tc_example(topo, delay, bw):
         net.start()
 
         # Check connectivity
-        assert_connectivity(net, v6=False)
-        assert_connectivity(net, v6=True)
-
-        # Check delay
-        assert_delay(net["h1"], net["h2"], delay, v6=False)
-        assert_delay(net["h1"], net["h2"], delay, v6=True)
-
-        # Check bandwidth
+        assert_dual_stack_connectivity(net)
+
+        # Check delay. The pings of both families run concurrently, pexec()
+        # does not use the shell of the node.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(assert_delay, net["h1"], net["h2"],
+                                       delay, v6=v6) for v6 in (False, True)]
+            for future in futures:
+                future.result()
+
+        # Check bandwidth. Each measurement needs the whole link, so the
+        # two families are measured one after the other.
         assert_bw(net["h1"], net["h2"], bw, v6=False, tolerance=bw // 10)
         assert_bw(net["h1"], net["h2"], bw, v6=True, tolerance=bw // 10)
 
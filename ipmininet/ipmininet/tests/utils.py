@@ -1,56 +1,94 @@
+import os
 import pytest
 import re
 import signal
 import time
-from typing import List, Tuple, Dict, Pattern, Match, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Pattern, Match, Optional, Union, \
+    Sequence
 
 import mininet.log
 from io import StringIO
-from ipaddress import ip_address, ip_network
+from ipaddress import ip_address, ip_network, IPv4Address, IPv6Address
 from ipmininet.utils import require_cmd
 from ipmininet.ipnet import IPNet
 from ipmininet.router import IPNode
 from ipmininet.ipswitch import IPSwitch
 from ipmininet.host.config.named import DNSRecord
 
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+WHITE_SPACE_RE = re.compile(r" +")
+STP_STATES = r"listening|learning|forwarding|blocking"
+HOSTS_UP_RE = re.compile(r"\((\d+) hosts? up\)")
+# The answer section ends with the next section or with the reply
+ANSWER_SECTION_RE = re.compile(r";; ANSWER SECTION:[^\n]*(?:\n|$)"
+                               r"((?:(?![^\n]*SECTION)[^\n]*(?:\n|$))*)")
+# Minimum time during which a traced path must stay the same to be converged
+MIN_STABLE_PATH_TIME = 5.
+
 
 def traceroute(net: IPNet, src: str, dst_ip: str, timeout=300) -> List[str]:
     require_cmd("traceroute", help_str="traceroute is required to run tests")
 
-    t = 0
     old_path_ips = []  # type: List[str]
     same_path_count = 0
-    white_space = re.compile(r" +")
-    while t != timeout / 5.:
-        out = net[src].cmd(["traceroute", "-w", "0.05", "-q", "1", "-n",
-                            "-m", len(net.routers) + len(net.hosts), dst_ip])
+    path_since = 0.
+    max_hops = str(len(net.routers) + len(net.hosts))
+    # Send the probes of all hops at once and run traceroute in its own
+    # process so that several paths can be traced concurrently
+    cmd = ["traceroute", "-w", "0.05", "-q", "1", "-n", "-m", max_hops,
+           "-N", max_hops, str(dst_ip)]
+    # Converged paths are often stable within a second, so the traces are
+    # first repeated quickly and then backed off to one every 5 seconds.
+    # A path is only accepted once it has stayed the same for
+    # MIN_STABLE_PATH_TIME so that routes that are still being recomputed
+    # are not mistaken for the converged ones.
+    deadline = time.monotonic() + timeout
+    delay = .5
+    while time.monotonic() < deadline:
+        out = net[src].popen(cmd, universal_newlines=True).communicate()[0]
         lines = out.split("\n")[1:-1]
         if "*" not in out and "!" not in out and "unreachable" not in out:
-            path_ips = [str(white_space.split(line)[2]) for line in lines]
+            path_ips = [str(WHITE_SPACE_RE.split(line)[2]) for line in lines]
             if len(path_ips) > 0 and path_ips[-1] == str(dst_ip) \
                     and old_path_ips == path_ips:
                 same_path_count += 1
-                if same_path_count > 2:
+                if same_path_count > 2 and time.monotonic() - path_since \
+                        >= MIN_STABLE_PATH_TIME:
                     # Network has converged
                     return path_ips
             else:
                 same_path_count = 0
+                path_since = time.monotonic()
 
             old_path_ips = path_ips
         else:
             same_path_count = 0
             old_path_ips = []
-        time.sleep(5)
-        t += 1
+        time.sleep(max(0., min(delay, deadline - time.monotonic())))
+        delay = min(delay * 2, 5.)
     return []
 
 
-def assert_path(net: IPNet, expected_path: List[str], v6=False, retry=5,
+def assert_path(net: IPNet, expected_path: Sequence[str], v6=False, retry=5,
                 timeout=300, traceroute_fun=traceroute, **kwargs):
+    # The expected paths may be shared tuples
+    expected_path = list(expected_path)
     src = expected_path[0]
     dst = expected_path[-1]
     dst_ip = net[dst].defaultIntf().ip6 if v6 else net[dst].defaultIntf().ip
 
+    # Map each address to its node once for all the hops of all the retries
+    nodes = {}  # type: Dict[Union[IPv4Address, IPv6Address], str]
+    for n in net.routers + net.hosts:
+        for itf in n.intfList():
+            for ip in (itf.ip6s() if v6 else itf.ips()):
+                nodes.setdefault(ip.ip, n.name)
+
     path = []  # type: List[str]
     i = 0
     while path != expected_path and i < retry:
@@ -58,21 +96,11 @@ def assert_path(net: IPNet, expected_path: List[str], v6=False, retry=5,
 
         path = [src]
         for path_ip in path_ips:
-            found = False
-            for n in net.routers + net.hosts:
-                for itf in n.intfList():
-                    itf_ips = itf.ip6s() if v6 else itf.ips()
-                    for ip in itf_ips:
-                        if ip.ip == ip_address(path_ip):
-                            found = True
-                            break
-                    if found:
-                        break
-                if found:
-                    path.append(n.name)
-                    break
-            assert found, "Traceroute returned the address '%s' " \
-                          "that cannot be linked to a node" % path_ip
+            node = nodes.get(ip_address(path_ip))
+            assert node is not None, \
+                "Traceroute returned the address '%s' that cannot be linked " \
+                "to a node" % path_ip
+            path.append(node)
         i += 1
 
     assert path == expected_path, "We expected the path from %s to %s to go " \
@@ -80,40 +108,99 @@ def assert_path(net: IPNet, expected_path: List[str], v6=False, retry=5,
                                   % (src, dst, expected_path[1:-1], path[1:-1])
 
 
-def host_connected(net: IPNet, v6=False, timeout=0.5, translate_address=True) \
-        -> bool:
+def assert_paths(net: IPNet, expected_paths: Sequence[Sequence[str]], v6=False,
+                 **kwargs):
+    """
+    Check several paths concurrently with assert_path()
+
+    :param net: The network to test
+    :param expected_paths: The list of paths to check
+    :param v6: Whether the paths are IPv6 or IPv4 ones
+    :param kwargs: Extra arguments of assert_path()
+    """
+    # traceroute() runs in its own process so every path can be checked
+    # concurrently. Other functions may use the shell of the source node,
+    # so paths starting from the same node are then checked one by one.
+    own_process = kwargs.get("traceroute_fun", traceroute) is traceroute
+    groups = {}  # type: Dict[Tuple[str, ...], List[List[str]]]
+    for path in dict.fromkeys(tuple(path) for path in expected_paths):
+        key = path if own_process else path[:1]
+        groups.setdefault(key, []).append(list(path))
+
+    def check(paths: List[List[str]]):
+        for path in paths:
+            assert_path(net, path, v6=v6, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(groups))) as executor:
+        futures = [executor.submit(check, paths)
+                   for paths in groups.values()]
+        for future in futures:
+            future.result()
+
+
+def nmap_cmd(targets: Sequence, v6: bool, timeout: float) -> List[str]:
+    """Return the arguments of an nmap host discovery of the targets"""
+    return ["nmap"] + (["-6"] if v6 else []) \
+        + ["-sn", "-n", "--max-retries", "5",
+           "--max-rtt-timeout", "%dms" % int(timeout * 1000)] \
+        + [str(target) for target in targets]
+
+
+def host_connected(net: IPNet, v6=False, timeout=0.5,
+                   translate_address=True) -> bool:
+    """
+    :param net: The network to test
+    :param v6: Whether to test IPv6 (True) or IPv4 (False) connectivity
+    :param timeout: The timeout of a single probe
+    :param translate_address: Whether to probe the IP address of the
+                              destination instead of its name
+    :return: True if every host can reach every other host
+    """
+    return _hosts_connected(net, (v6,), timeout, translate_address)
+
+
+def _hosts_connected(net: IPNet, families: Sequence[bool], timeout: float,
+                     translate_address: bool) -> bool:
+    """Return True if every host can reach every other host over each of
+    the given families, True standing for IPv6. The families are probed
+    concurrently."""
     require_cmd("nmap", help_str="nmap is required to run tests")
 
-    for src in net.hosts:
+    if translate_address:
+        # A single 'ip address show' refreshes the addresses of both families
         for dst in net.hosts:
-            if src != dst:
-                dst.defaultIntf().updateIP()
-                dst.defaultIntf().updateIP6()
-                if translate_address:
-                    dst_ip = dst.defaultIntf().ip6 if v6 \
-                        else dst.defaultIntf().ip
-                else:
-                    dst_ip = dst
-                cmd = "nmap%s -sn -n --max-retries 5 --max-rtt-timeout %dms %s"\
-                      % (" -6" if v6 else "", int(timeout * 1000), dst_ip)
-                out = src.cmd(cmd.split(" "))
-                if "0 hosts up" in out:
-                    return False
-                # In case of flooding, hosts might not answer
-                # So, we wait a bit before testing the next pair of hosts
-                time.sleep(0.1)
+            dst.defaultIntf().updateAddr()
+    for src in net.hosts:
+        dsts = [dst for dst in net.hosts if dst != src]
+        if not dsts:
+            continue
+        # A single nmap probes all the other hosts
+        probes = []
+        for family_v6 in families:
+            if translate_address:
+                dst_ips = [dst.defaultIntf().ip6 if family_v6
+                           else dst.defaultIntf().ip for dst in dsts]
+            else:
+                dst_ips = dsts
+            probes.append(src.popen(nmap_cmd(dst_ips, family_v6, timeout),
+                                    universal_newlines=True))
+        outs = [p.communicate()[0] for p in probes]
+        for out in outs:
+            match = HOSTS_UP_RE.search(out)
+            if match is None or int(match.group(1)) < len(dsts):
+                return False
+        # In case of flooding, hosts might not answer
+        # So, we wait a bit before testing the next source
+        time.sleep(0.1)
     return True
 
 
 def assert_node_not_connected(src: IPNode, dst: IPNode, v6=False, timeout=0.5):
     require_cmd("nmap", help_str="nmap is required to run tests")
 
-    dst.defaultIntf().updateIP()
-    dst.defaultIntf().updateIP6()
+    dst.defaultIntf().updateAddr()
     dst_ip = dst.defaultIntf().ip6 if v6 else dst.defaultIntf().ip
-    cmd = "nmap%s -sn -n --max-retries 5 --max-rtt-timeout %dms %s" \
-          % (" -6" if v6 else "", int(timeout * 1000), dst_ip)
-    out = src.cmd(cmd.split(" "))
+    out = src.cmd(nmap_cmd([dst_ip], v6, timeout))
 
     assert "0 hosts up" in out, "Node {} is connected to node {} over {}" \
         .format(src.name, dst.name, "IPv4" if not v6 else "IPv6")
@@ -121,14 +208,26 @@ def assert_node_not_connected(src: IPNode, dst: IPNode, v6=False, timeout=0.5):
 
 def assert_connectivity(net: IPNet, v6=False, attempts=300,
                         translate_address=True):
+    _assert_connectivity(net, (v6,), attempts, translate_address)
+
+
+def assert_dual_stack_connectivity(net: IPNet, attempts=300,
+                                   translate_address=True):
+    """Check both the IPv4 and the IPv6 connectivity, the two families are
+    probed concurrently"""
+    _assert_connectivity(net, (False, True), attempts, translate_address)
+
+
+def _assert_connectivity(net: IPNet, families: Sequence[bool], attempts: int,
+                         translate_address: bool):
     t = 0
     while t != attempts \
-            and not host_connected(net, v6=v6,
-                                   translate_address=translate_address):
+            and not _hosts_connected(net, families, 0.5, translate_address):
         t += 1
         time.sleep(5)
-    assert host_connected(net, v6=v6, translate_address=translate_address),\
-        "Cannot ping all hosts over %s" % ("IPv4" if not v6 else "IPv6")
+    assert _hosts_connected(net, families, 0.5, translate_address), \
+        "Cannot ping all hosts over %s" \
+        % " and ".join("IPv6" if v6 else "IPv4" for v6 in families)
 
 
 def check_tcp_connectivity(client: IPNode, server: IPNode, v6=False,
@@ -139,13 +238,14 @@ def check_tcp_connectivity(client: IPNode, server: IPNode, v6=False,
     if server_itf is None:
         server_itf = server.defaultIntf()
     server_ip = server_itf.ip6 if v6 else server_itf.ip
-    server_cmd = "nc %s -l %d" % ("-6" if v6 else "-4", server_port)
-    server_p = server.popen(server_cmd.split(" "))
+    server_cmd = ["nc", "-6" if v6 else "-4", "-l", str(server_port)]
+    server_p = server.popen(server_cmd)
 
     t = 0
-    client_cmd = "nc -z -w 1 -v %s %d" % (server_ip, server_port)
+    client_cmd = ["nc", "-z", "-w", "1", "-v", str(server_ip),
+                  str(server_port)]
 
-    client_p = client.popen(client_cmd.split(" "))
+    client_p = client.popen(client_cmd)
     while t != timeout * 2 and client_p.wait() != 0:
         t += 1
         if server_p.poll() is not None:
@@ -154,7 +254,7 @@ def check_tcp_connectivity(client: IPNode, server: IPNode, v6=False,
                 "The netcat server used to check TCP connectivity failed" \
                 " with the output:\n[stdout]\n%s\n[stderr]\n%s" % (out, err)
         time.sleep(.5)
-        client_p = client.popen(client_cmd.split(" "))
+        client_p = client.popen(client_cmd)
     out, err = client_p.communicate()
     code = client_p.poll()
     server_p.send_signal(signal.SIGINT)
@@ -162,6 +262,23 @@ def check_tcp_connectivity(client: IPNode, server: IPNode, v6=False,
     return code, out, err
 
 
+def check_tcp_connectivities(client: IPNode, server: IPNode,
+                             server_ports: List[int], **kwargs) \
+        -> Dict[int, Tuple[int, bytes, bytes]]:
+    """Run check_tcp_connectivity() concurrently for several server ports
+
+    :param client: The client node
+    :param server: The server node
+    :param server_ports: The ports to check
+    :param kwargs: Extra arguments of check_tcp_connectivity()
+    :return: The result of check_tcp_connectivity() for each port"""
+    with ThreadPoolExecutor(max_workers=max(1, len(server_ports))) as executor:
+        futures = {port: executor.submit(check_tcp_connectivity, client,
+                                         server, server_port=port, **kwargs)
+                   for port in server_ports}
+        return {port: future.result() for port, future in futures.items()}
+
+
 def assert_stp_state(switch: IPSwitch, expected_states: Dict[str, str],
                      timeout=60):
     """
@@ -174,25 +291,25 @@ def assert_stp_state(switch: IPSwitch, expected_states: Dict[str, str],
     require_cmd("brctl", help_str="brctl is required to run tests")
 
     partial_cmd = "brctl showstp"
-    possible_states = "listening|learning|forwarding|blocking"
+    # brctl prints the state of a port on the line following its name
+    port_state = re.compile(r"(%s-eth[0-9]+)\b[^\n]*\n[^\n]*?(%s)"
+                            % (re.escape(switch.name), STP_STATES))
     # In these states the STP has not converged
     ignore_state = "listening", "learning"
     cmd = ("%s %s" % (partial_cmd, switch.name))
     out = switch.cmd(cmd)
-    states = re.findall(possible_states, out)
+    state_map = dict(port_state.findall(out))
     # wait for the ports to be bounded
     count = 0
-    while any(item in states for item in ignore_state):
+    while any(item in state_map.values() for item in ignore_state):
         if count == timeout:
             pytest.fail("Timeout of %d seconds while waiting for the spanning"
                         " tree to be computed" % timeout)
         time.sleep(1)
         count += 1
         out = switch.cmd(cmd)
-        states = re.findall(possible_states, out)
+        state_map = dict(port_state.findall(out))
 
-    interfaces = re.findall(switch.name + r"-eth[0-9]+", out)
-    state_map = {interfaces[i]: states[i] for i in range(len(states))}
     for itf, _ in expected_states.items():
         assert itf in state_map,\
             "The port %s of switch %s was not mentioned in the output of " \
@@ -213,8 +330,9 @@ def assert_routing_table(router: IPNode, expected_prefixes: List[str],
     """
 
     cmd = "ip -%d route" % ip_network(str(expected_prefixes[0])).version
+    prefixes_re = re.compile(r"|".join(expected_prefixes))
     out = router.cmd(cmd)
-    prefixes = re.findall(r"|".join(expected_prefixes), out)
+    prefixes = prefixes_re.findall(out)
     count = 0
     while any(item in prefixes for item in expected_prefixes):
         if count == timeout:
@@ -223,46 +341,82 @@ def assert_routing_table(router: IPNode, expected_prefixes: List[str],
         time.sleep(1)
         count += 1
         out = router.cmd(cmd)
-        prefixes = re.findall(r"|".join(expected_prefixes), out)
+        prefixes = prefixes_re.findall(out)
     assert len(prefixes) == 0
 
 
 def search_dns_reply(reply: str, regex: Pattern) \
         -> Tuple[bool, Optional[Match]]:
 
-    got_answer = False
-    for line in reply.split("\n"):
-        if got_answer:
-            if "SECTION" in line:
-                break  # End of the answer section
-            match = regex.match(line)
-            if match is not None:
-                return True, match  # Got the right answer
-        elif ";; ANSWER SECTION:" in line:  # Beginning of the answer section
-            got_answer = True
-    return got_answer, None
+    answer = ANSWER_SECTION_RE.search(reply)
+    if answer is None:
+        return False, None
+    # Only the records of the answer section are matched
+    for line in answer.group(1).splitlines():
+        match = regex.match(line)
+        if match is not None:
+            return True, match  # Got the right answer
+    return True, None
+
+
+def wait_for_dns(node: IPNode, dns_server_address: str, record: DNSRecord,
+                 port=53, timeout=60, interval=.2) -> List[str]:
+    """
+    Wait until a DNS server answers a query for a record
+
+    :param node: The node sending the queries
+    :param dns_server_address: The address of the DNS server
+    :param record: The record to query, only its type and name are used
+    :param port: The port of the DNS server
+    :param timeout: Time to wait for an answer
+    :param interval: Time between two queries
+    :return: The lines of the answer
+    """
+    require_cmd("dig", help_str="dig is required to run tests")
+
+    cmd = ["dig", "+short", "@%s" % dns_server_address, "-p", port,
+           "-t", record.rtype, record.domain_name or "."]
+    deadline = time.time() + timeout
+    while True:
+        out = node.cmd(cmd)
+        answer = [line for line in out.splitlines()
+                  if line.strip() and not line.startswith(";")]
+        if answer or time.time() >= deadline:
+            break
+        time.sleep(interval)
+
+    assert answer, "No answer for the %s record of '%s' was received in %s" \
+                   " from server %s after %s seconds:\n%s" \
+                   % (record.rtype, record.domain_name, node.name,
+                      dns_server_address, timeout, out)
+    return answer
 
 
 def assert_dns_record(node: IPNode, dns_server_address: str, record: DNSRecord,
                       port=53, timeout=60):
     require_cmd("dig", help_str="dig is required to run tests")
 
-    server_cmd = "dig @{address} -p {port} -t {rtype} {domain_name}"\
-        .format(address=dns_server_address, rtype=record.rtype,
-                domain_name=record.domain_name, port=port)
+    dig_cmd = ["dig", "@%s" % dns_server_address, "-p", str(port),
+               "-t", record.rtype, str(record.domain_name)]
+    server_cmd = " ".join(dig_cmd)  # For the error messages
     out_regex = re.compile(r" *{name}.?[ \t]+{ttl}[ \t]+IN[ \t]+{rtype}[ \t]+"
                            r"{rdata}"
                            .format(rtype=record.rtype, ttl=record.ttl,
                                    name=record.domain_name,
                                    rdata=record.rdata))
 
+    def dig() -> str:
+        # Use a separate process rather than the shell of the node
+        # so that several records can be checked concurrently
+        return node.popen(dig_cmd, universal_newlines=True).communicate()[0]
+
     t = 0
-    out = node.cmd(server_cmd.split(" "))
+    out = dig()
     got_answer, match = search_dns_reply(out, out_regex)
     while t < timeout * 2 and match is None:
         t += 1
         time.sleep(.5)
-        out = node.cmd(server_cmd.split(" "))
+        out = dig()
         got_answer, match = search_dns_reply(out, out_regex)
 
     assert got_answer, "No answer was received in %s" \
@@ -275,6 +429,16 @@ def assert_dns_record(node: IPNode, dns_server_address: str, record: DNSRecord,
                                            node.name, dns_server_address, out)
 
 
+def assert_dns_records(node: IPNode, dns_server_address: str,
+                       records: List[DNSRecord], **kwargs):
+    """Check concurrently several records with assert_dns_record()"""
+    with ThreadPoolExecutor(max_workers=max(1, len(records))) as executor:
+        futures = [executor.submit(assert_dns_record, node, dns_server_address,
+                                   record, **kwargs) for record in records]
+        for future in futures:
+            future.result()
+
+
 class CLICapture:
 
     def __init__(self, loglevel: str):
@@ -294,3 +458,84 @@ class CLICapture:
         self.handler.flush()
         self.handler.close()
         self.out = self.stream.getvalue().splitlines()
+
+
+def wait_for_files(paths: List[str], timeout=10., interval=.1) -> List[str]:
+    """
+    Wait until files are created
+
+    If inotify_simple is installed, the creations are waited for without
+    polling the filesystem.
+
+    :param paths: The paths of the files
+    :param timeout: Time to wait for the files
+    :param interval: Time between two checks if inotify_simple is missing
+    :return: The paths of the files that were not created in time
+    """
+    deadline = time.time() + timeout
+    if inotify_simple is None:
+        pending = [path for path in paths if not os.path.exists(path)]
+        while pending and time.time() < deadline:
+            time.sleep(interval)
+            pending = [path for path in pending if not os.path.exists(path)]
+        return pending
+
+    flags = inotify_simple.flags.CREATE | inotify_simple.flags.MOVED_TO
+    with inotify_simple.INotify() as inotify:
+        # Watch before checking so that no creation is missed
+        for directory in {os.path.dirname(path) or "." for path in paths}:
+            inotify.add_watch(directory, flags)
+        pending = [path for path in paths if not os.path.exists(path)]
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            inotify.read(timeout=int(remaining * 1000) + 1)
+            pending = [path for path in pending if not os.path.exists(path)]
+    return pending
+
+
+def wait_for_listening_port(node: IPNode, port: int, timeout=30.,
+                            interval=.1) -> bool:
+    """
+    Wait until a TCP socket listens on a port in the namespace of a node
+
+    The sockets are read from /proc so that no process is spawned and no
+    connection is made to the server.
+
+    :param node: The node
+    :param port: The TCP port
+    :param timeout: Time to wait for the socket
+    :param interval: Time between two checks
+    :return: Whether a socket listens on the port
+    """
+    # The port is in hexadecimal and the state 0A is LISTEN
+    local_port = ":%04X" % port
+    deadline = time.time() + timeout
+    while True:
+        for table in ("tcp", "tcp6"):
+            with open("/proc/%d/net/%s" % (node.pid, table)) as fileobj:
+                next(fileobj)  # Header
+                for line in fileobj:
+                    fields = line.split()
+                    if fields[3] == "0A" and fields[1].endswith(local_port):
+                        return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def assert_cfg_lines(path: str, expected_lines: List[str]):
+    """
+    Assert that a configuration file contains each of the expected lines
+
+    :param path: The path of the configuration file
+    :param expected_lines: The lines, without their newline character
+    """
+    with open(path) as fileobj:
+        cfg = fileobj.read()
+    # Only match full lines
+    lines = set(cfg.splitlines())
+    missing = [line for line in expected_lines if line not in lines]
+    assert not missing, "Cannot find the lines %s in the generated " \
+                        "configuration:\n%s" % (missing, cfg)
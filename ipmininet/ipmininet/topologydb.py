@@ -4,12 +4,18 @@ from builtins import str
 
 import json
 import itertools
+import sys
 from ipaddress import ip_interface
 
 from .utils import otherIntf, realIntfList
 
 from mininet.log import lg
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class TopologyDB:
     """A convenience store for auto-allocated mininet properties.
@@ -40,15 +46,31 @@ class TopologyDB:
         """Load a topology database
 
         :param fpath: path towards the file to load"""
-        with open(fpath, 'r') as f:
-            self._network = json.load(f)
+        with open(fpath, 'rb') as f:
+            data = f.read()
+        network = orjson.loads(data) if orjson else json.loads(data)
+        # Share a single string object for every occurrence of a node or an
+        # interface name across the database
+        self._network = {}
+        for name, props in network.items():
+            node = self._network[sys.intern(name)] = {}
+            for key, val in props.items():
+                if isinstance(val, dict) and 'name' in val:
+                    val['name'] = sys.intern(val['name'])
+                elif key == 'interfaces':
+                    val = [sys.intern(itf) for itf in val]
+                node[sys.intern(key)] = val
 
     def save(self, fpath):
         """Save the topology database
 
         :param fpath: the save file name"""
-        with open(fpath, 'w') as f:
-            json.dump(self._network, f)
+        if orjson:
+            with open(fpath, 'wb') as f:
+                f.write(orjson.dumps(self._network))
+        else:
+            with open(fpath, 'w') as f:
+                json.dump(self._network, f)
 
     def _node(self, x):
         try:
@@ -118,20 +140,21 @@ class TopologyDB:
 
     def _add_node(self, n, props):
         itfs = realIntfList(n)
-        props['interfaces'] = [itf.name for itf in itfs]
-        for itf in itfs:
+        names = [sys.intern(itf.name) for itf in itfs]
+        props['interfaces'] = names
+        for itf, name in zip(itfs, names):
             nh = otherIntf(itf)
             itf_props = {
                 'ip': '%s/%s' % (itf.ip, itf.prefixLen),
                 'ips': [ip.with_prefixlen
                         for ip in itertools.chain(itf.ips(), itf.ip6s())],
-                'name': itf.name,
+                'name': name,
                 'bw': itf.params.get('bw', -1)
             }
             if nh:
-                props[nh.node.name] = itf_props
-            props[itf.name] = itf_props
-        self._network[n.name] = props
+                props[sys.intern(nh.node.name)] = itf_props
+            props[name] = itf_props
+        self._network[sys.intern(n.name)] = props
 
     def add_host(self, n):
         """Register an host
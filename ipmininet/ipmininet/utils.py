@@ -1,6 +1,6 @@
 """utils: utility functions to manipulate host, interfaces, ..."""
 import collections
-import os
+import shutil
 
 from mininet.link import Intf
 from mininet.log import lg as log
@@ -14,18 +14,19 @@ if TYPE_CHECKING:
     from ipmininet.link import IPIntf
 
 
+# Executables are not expected to disappear while the network runs, but
+# missing ones might be installed in the meantime
+_available_cmds = set()  # type: Set[str]
+
+
 def has_cmd(cmd: str) -> bool:
     """Return whether the given executable is available on the system or not"""
-    # Check if cmd is a valid absolute path
-    if os.path.isfile(cmd) and os.access(cmd, os.X_OK):
+    if cmd in _available_cmds:
         return True
-    # Try to find the cmd in each directory in $PATH
-    for path in os.environ["PATH"].split(os.path.pathsep):
-        path = path.strip('"')
-        exe = os.path.join(path, cmd)
-        if os.path.isfile(exe) and os.access(exe, os.X_OK):
-            return True
-    return False
+    if shutil.which(cmd) is None:
+        return False
+    _available_cmds.add(cmd)
+    return True
 
 
 def require_cmd(cmd: str, help_str: Optional[str] = None):
@@ -46,7 +47,7 @@ def require_cmd(cmd: str, help_str: Optional[str] = None):
 def otherIntf(intf: Intf) -> Optional['IPIntf']:
     """"Get the interface on the other side of a link"""
     link = intf.link
-    return (link.intf1 if link.intf2 == intf else link.intf2) if link else None
+    return (link.intf1 if link.intf2 is intf else link.intf2) if link else None
 
 
 def realIntfList(n: Node) -> List['IPIntf']:
@@ -67,12 +68,12 @@ def address_pair(n: Node, use_v4=True, use_v6=True) \
         if not isinstance(itf, IPIntf):
             continue
 
+        # Both families are refreshed by a single address dump
+        itf.updateAddr()
         if use_v4 and v4_str is None:
-            itf.updateIP()
             v4 = next(itf.ips(), None)
             v4_str = v4.ip.compressed if v4 is not None else v4
         if use_v6 and v6_str is None:
-            itf.updateIP6()
             v6 = next(itf.ip6s(exclude_lls=True), None)
             v6_str = v6.ip.compressed if v6 is not None else v6
         if (not use_v4 or v4_str is not None) \
@@ -92,8 +93,9 @@ def is_subnet_of(a: Union[IPv4Network, IPv6Network],
         if a.version != b.version:
             raise TypeError("{} and {} are not of the same version"
                             .format(a, b))
-        return (b.network_address <= a.network_address and
-                b.broadcast_address >= a.broadcast_address)
+        # Compare the integer values to skip the address comparison methods
+        return (int(b.network_address) <= int(a.network_address) and
+                int(b.broadcast_address) >= int(a.broadcast_address))
     except AttributeError:
         raise TypeError("Unable to test subnet containment "
                         "between {} and {}".format(a, b))
@@ -109,12 +111,8 @@ def prefix_for_netmask(mask: Union[IPv4Address, IPv6Address, str]) -> int:
     """Return the prefix length associated to a given netmask.
     Will return garbage if the netmask is unproperly formatted!"""
     ip = ip_address(str(mask))
-    v = ~int(ip) & ~(1 - (1 << ip.max_prefixlen))
-    length = 0
-    while v > 0:
-        v >>= 1
-        length += 1
-    return ip.max_prefixlen - length
+    host_bits = ~int(ip) & ((1 << ip.max_prefixlen) - 1)
+    return ip.max_prefixlen - host_bits.bit_length()
 
 
 class L3Router:
@@ -155,18 +153,19 @@ def find_node(start: Node, node_name: str) -> Optional[Intf]:
     if start.name == node_name:
         return start.intf()
 
-    visited = set()  # type: Set[IPIntf]
+    # The interfaces of a router are listed once, even if the router
+    # is reached through several of its interfaces. Since an interface
+    # belongs to a single node, each interface is then visited once.
+    visited = {start}  # type: Set[Node]
     to_visit = realIntfList(start)
     # Explore all interfaces recursively, until we find one
     # connected to the node
     while to_visit:
         i = to_visit.pop()
-        if i in visited:
-            continue
-        visited.add(i)
         for n in i.broadcast_domain.interfaces:
             if n.node.name == node_name:
                 return n
-            if L3Router.is_l3router_intf(n):
+            if L3Router.is_l3router_intf(n) and n.node not in visited:
+                visited.add(n.node)
                 to_visit.extend(realIntfList(n.node))
     return None
@@ -6,16 +6,29 @@ import os
 import shutil
 import sys
 
-from pkg_resources import parse_version, require
 from setuptools import setup, find_packages
 from setuptools.command.develop import develop
 from setuptools.command.install import install
 
+try:
+    from importlib.metadata import version as dist_version, \
+        PackageNotFoundError
+    from packaging.version import parse as parse_version
+except ImportError:
+    # Python < 3.8 or no packaging module, pkg_resources is slower to import
+    from pkg_resources import parse_version, require, \
+        DistributionNotFound as PackageNotFoundError
+
+    def dist_version(name):
+        return require(name)[0].version
+
 VERSION = '1.1'
 
 modname = distname = 'ipmininet'
 
 MININET_VERSION = "2.3.0"
+# Records the Mininet version of the installed dependencies
+MININET_VERSION_FILE = ".version"
 install_requires = [
     'setuptools',
     'mako>=1.1,<1.2'
@@ -29,8 +42,8 @@ SPIN_PIP_VER = parse_version("18.1")
 
 # Get back Pip version
 try:
-    version = parse_version(require("pip")[0].version)
-except IndexError:
+    version = parse_version(dist_version("pip"))
+except (PackageNotFoundError, IndexError):
     version = parse_version("0")
     print("We cannot find the version of pip."
           "We assume that is it inferior to %s." % SPIN_PIP_VER)
@@ -50,16 +63,31 @@ def setup_mininet_dep():
     Install the Mininet dependencies
     """
     mn_dir = "mininet_dependencies"
-    if not os.path.exists(os.path.join("/opt", mn_dir)):
-        tmp_dir = os.path.dirname(__file__)
-        sys.path.insert(0, os.path.join(tmp_dir, "ipmininet/install"))
-        from install import install_mininet
-
-        mininet_dir = os.path.join(tmp_dir, "mininet_dependencies")
-        os.mkdir(mininet_dir)
-
-        install_mininet(mininet_dir, pip_install=False)
-        shutil.move(mininet_dir, "/opt")
+    opt_dir = os.path.join("/opt", mn_dir)
+    if os.path.exists(opt_dir):
+        try:
+            with open(os.path.join(opt_dir, MININET_VERSION_FILE)) as f:
+                if f.read().strip() == MININET_VERSION:
+                    return
+        except FileNotFoundError:
+            # Installed before the version was recorded
+            return
+
+    tmp_dir = os.path.dirname(__file__)
+    sys.path.insert(0, os.path.join(tmp_dir, "ipmininet/install"))
+    from install import install_mininet
+
+    mininet_dir = os.path.join(tmp_dir, "mininet_dependencies")
+    os.mkdir(mininet_dir)
+
+    install_mininet(mininet_dir, pip_install=False)
+    with open(os.path.join(mininet_dir, MININET_VERSION_FILE), "w") as f:
+        f.write(MININET_VERSION)
+    # Only replace the dependencies of another version once the new ones
+    # are installed
+    if os.path.exists(opt_dir):
+        shutil.rmtree(opt_dir)
+    shutil.move(mininet_dir, "/opt")
 
 
 class PostDevelopCommand(develop):
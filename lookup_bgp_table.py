@@ -1,29 +1,106 @@
+import json
+import logging
+import os
 import telnetlib
 import re
+import socket
 import subprocess
 from time import sleep
 
-def load_bgp_table():
-    tn = telnetlib.Telnet("localhost", 2605)
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+log = logging.getLogger(__name__)
+
+
+class VtyTelnet(telnetlib.Telnet):
+    """Telnet client that reads the large outputs of the FRR daemons in
+    big chunks instead of byte per byte"""
+
+    def open(self, *args, **kwargs):
+        super().open(*args, **kwargs)
+        # Send the password and the commands without waiting for ACKs
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def fill_rawq(self):
+        # process_rawq() below handles large buffers in linear time
+        if self.irawq >= len(self.rawq):
+            self.rawq = b''
+            self.irawq = 0
+        buf = self.sock.recv(4096)
+        self.msg("recv %r", buf)
+        self.eof = (not buf)
+        self.rawq = self.rawq + buf
+
+    def process_rawq(self):
+        # Copy the data up to the next telnet command in one slice, the
+        # commands themselves are left to the byte per byte parser
+        if not self.iacseq and not self.sb:
+            end = self.rawq.find(telnetlib.IAC, self.irawq)
+            if end == -1:
+                end = len(self.rawq)
+            self.cookedq += self.rawq[self.irawq:end] \
+                .replace(telnetlib.theNULL, b"").replace(b"\021", b"")
+            self.irawq = end
+            if self.irawq >= len(self.rawq):
+                self.rawq = b''
+                self.irawq = 0
+        super().process_rawq()
+
+
+class VtySession:
+    """Persistent session with the vty of an FRR daemon, the connection is
+    kept open across the polls and reopened if the daemon closes it"""
+
+    def __init__(self, port, password="zebra", timeout=10):
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.tn = None
+        self.prompt = None
+
+    def connect(self):
+        self.tn = VtyTelnet("localhost", self.port)
+        self.tn.read_until(b"Password: ")
+        self.tn.write(self.password.encode('ascii') + b"\n")
+        # The prompt that follows the login also ends every command output
+        banner = self.tn.read_until(b"> ", self.timeout)
+        self.prompt = b"\n" + banner.rsplit(b"\n", 1)[-1]
+
+    def close(self):
+        if self.tn is not None:
+            self.tn.close()
+        self.tn = None
+
+    def command(self, cmd):
+        for attempt in range(2):
+            try:
+                if self.tn is None:
+                    self.connect()
+                self.tn.write(cmd.encode('ascii') + b"\n")
+                out = self.tn.read_until(self.prompt, self.timeout)
+                if out.endswith(self.prompt):
+                    return out.decode('ascii')
+            except (EOFError, OSError):
+                if attempt:
+                    raise
+            # A late output would be mistaken for the next one
+            self.close()
+        raise TimeoutError("No prompt from the vty on port %d" % self.port)
+
+
+bgpd = VtySession(2605)
+zebra = VtySession(2601)
 
-    tn.read_until(b"Password: ")
-    tn.write("zebra".encode('ascii') + b"\n")
-    tn.write(b"sh bgp\n")
-    tn.write(b"exit\n")
 
-    return tn.read_all().decode('ascii')
+def load_bgp_table():
+    return bgpd.command("sh bgp")
 
 
 def load_ip_route_table():
-    tn = telnetlib.Telnet("localhost", 2601)
-
-    tn.read_until(b"Password: ")
-    tn.write("zebra".encode('ascii') + b"\n")
-
-    tn.write(b"sh ipv6 route\n")
-    tn.write(b"exit\n")
-
-    return tn.read_all().decode('ascii')
+    return zebra.command("sh ipv6 route")
 
 ############################################################
 #
@@ -47,59 +124,90 @@ def load_ip_route_table():
 #         (IPV6SEG:){1,4}:IPV4ADDR               # 2001:db8:3:4::192.0.2.33  64:ff9b::192.0.2.33 (IPv4-Embedded IPv6 Address)
 #         )
 
-def parse_bgp_table(table):
-    IPV6ADDR = r"((([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}|[0-9a-fA-F]{1,4}:((:[0-9a-fA-F]{1,4}){1,6})|:((:[0-9a-fA-F]{1,4}){1,7}|:)|([0-9a-fA-F]{1,4}:){1,7}:|fe80:(:[0-9a-fA-F]{0,4}){0,4}%[0-9a-zA-Z]{1,}|::(ffff(:0{1,4}){0,1}:){0,1}((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])|([0-9a-fA-F]{1,4}:){1,4}:((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9]))(/[0-9]{1,3})?)"
+IPV6ADDR = r"((([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}|[0-9a-fA-F]{1,4}:((:[0-9a-fA-F]{1,4}){1,6})|:((:[0-9a-fA-F]{1,4}){1,7}|:)|([0-9a-fA-F]{1,4}:){1,7}:|fe80:(:[0-9a-fA-F]{0,4}){0,4}%[0-9a-zA-Z]{1,}|::(ffff(:0{1,4}){0,1}:){0,1}((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])|([0-9a-fA-F]{1,4}:){1,4}:((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9]))(/[0-9]{1,3})?)"
+
+# The patterns are compiled once for all the polls of the main loop.
+# google-re2, if installed, matches the nested repetitions of the address
+# pattern in linear time instead of backtracking over its alternatives.
+_ADDR_RE_MODULE = re2 if re2 is not None else re
+_IPV6_RE = _ADDR_RE_MODULE.compile(IPV6ADDR)
+_NEXTHOP_RE = _ADDR_RE_MODULE.compile(IPV6ADDR + r", (.*), weight")
+_BGP_LINE_RE = re.compile(r"\*>.*\n")
+_ROUTE_BLOCK_RE = re.compile(r"(B>(.|\n)*?(?=\n[a-zA-Z]))")
 
 
-    lines = re.findall(r"\*>.*\n", table)
+def parse_bgp_table(table):
+    lines = _BGP_LINE_RE.findall(table)
 
-    matches = map(lambda line: re.findall(IPV6ADDR, line), lines)
+    matches = map(lambda line: _IPV6_RE.findall(line), lines)
     addresses = map(lambda pair: (pair[0][0], pair[1][0]), matches)
 
     return list(addresses)
 
 
-def parse_ip_route_table(table):
-    IPV6ADDR = r"((([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}|[0-9a-fA-F]{1,4}:((:[0-9a-fA-F]{1,4}){1,6})|:((:[0-9a-fA-F]{1,4}){1,7}|:)|([0-9a-fA-F]{1,4}:){1,7}:|fe80:(:[0-9a-fA-F]{0,4}){0,4}%[0-9a-zA-Z]{1,}|::(ffff(:0{1,4}){0,1}:){0,1}((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])|([0-9a-fA-F]{1,4}:){1,4}:((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9]))(/[0-9]{1,3})?)"
-    NEXTHOP = IPV6ADDR + r", (.*), weight"
+def may_hold_ipv6(text):
+    """Cheap prematch of IPV6ADDR: apart from the zoned 'fe80:%eth0' form,
+    which zebra does not print, every address it accepts is either
+    compressed with '::' or written with 7 colons"""
+    return "::" in text or text.count(":") >= 7
 
-    lines = re.findall(r"(B>(.|\n)*?(?=\n[a-zA-Z]))", table)
 
+def parse_ip_route_table(table):
+    addresses = []
+    for block, _ in _ROUTE_BLOCK_RE.findall(table):
+        # Only run the address patterns on the blocks that can match them
+        if not may_hold_ipv6(block):
+            continue
+        addrs = _IPV6_RE.findall(block)
+        nexthops = _NEXTHOP_RE.findall(block)
+        if len(addrs) >= 2 and nexthops:
+            addresses.append((addrs[0][0], addrs[1][0], nexthops[0][-1]))
 
-    match_nexthop = map(lambda line: re.findall(NEXTHOP, line[0]), lines)
-    match_addr = map(lambda line: re.findall(IPV6ADDR, line[0]), lines)
-    addresses = map(lambda pair: (pair[0][0][0], pair[0][1][0], pair[1][0][-1]), zip(match_addr, match_nexthop))
-
-    return list(addresses)
+    return addresses
 
 
 def get_existing_config():
-    # source: https://www.cyberciti.biz/faq/python-run-external-command-and-get-output/
-    p = subprocess.Popen("ip -6 route | grep seg6 | cut -f1 -d ' '", stdout=subprocess.PIPE, shell=True)
- 
-    ## Talk with date command i.e. read data from stdout and stderr. Store this info in tuple ##
-    ## Interact with process: Send data to stdin. Read data from stdout and stderr, until end-of-file is reached.  ##
-    ## Wait for process to terminate. The optional input argument should be a string to be sent to the child process, ##
-    ## or None, if no data should be sent to the child.
-    (output, err) = p.communicate()
-     
-    ## Wait for date to terminate. Get return returncode ##
-    p_status = p.wait()
-    return output.decode().strip().split("\n")
+    """Return the destinations of the installed seg6 routes"""
+    out = subprocess.check_output(["ip", "-6", "-j", "route", "show"])
+    return [route["dst"] for route in json.loads(out or b"[]")
+            if route.get("encap") == "seg6"]
+
+
+def ip_route_batch(commands):
+    """Run the given 'ip -6 route' commands with a single ip process,
+    -force keeps going after a failed command like separate calls would"""
+    if commands:
+        subprocess.run(["ip", "-6", "-force", "-batch", "-"],
+                       input="".join(cmd + "\n" for cmd in commands),
+                       universal_newlines=True)
 
 
 if __name__ == "__main__":
+    # The standard streams are shared with the shell of the mininet node.
+    # The log file is only created once an error is logged.
+    handler = logging.FileHandler("/tmp/lookup_bgp_table_%d.log" % os.getpid(),
+                                  delay=True)
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s %(message)s"))
+    logging.basicConfig(handlers=[handler])
     while True:
         sleep(15)
         existing = get_existing_config()
-        for addr in existing:
-            subprocess.call(["ip", "-6", "route", "del", addr])
+        # The seg6 routes are all removed before reading the table, zebra
+        # would otherwise prefer them as kernel routes over the BGP ones
+        ip_route_batch(["route del " + addr for addr in existing if addr])
         sleep(.1)
-        table = load_ip_route_table()
+        try:
+            table = load_ip_route_table()
+        except (TimeoutError, EOFError, OSError):
+            # The routes are installed again at the next poll
+            log.exception("Cannot read the routing table of zebra")
+            zebra.close()
+            continue
         # print(table)
         nexthops = parse_ip_route_table(table)
-        for addr, nexthop, dev in nexthops:
-            # print(addr, nexthop, dev)
-            if "fe80" not in nexthop:
-                subprocess.call(["ip", "-6", "route", "replace", addr, "encap", "seg6", "mode", "inline", "segs", nexthop, "dev", dev])
+        ip_route_batch(["route replace %s encap seg6 mode inline segs %s dev %s"
+                        % (addr, nexthop, dev)
+                        for addr, nexthop, dev in nexthops
+                        if "fe80" not in nexthop])
         # break
\ No newline at end of file
@@ -6,21 +6,17 @@ import matplotlib.pyplot as plt
 
 
 def get_means():
-    receiver = []
-    sender = []
-
-    with open("mean.txt", "r") as f:
-        for line in f.readlines():
-            d = line.strip().split(" ")
-            if d[0] == "sender":
-                sender.append(float(d[1]))
-            elif d[0] == "receiver":
-                receiver.append(float(d[1]))
-            else:
-                print(line, ": Invalid Format")
-
-
-    data = pd.DataFrame({"sender":sender, "receiver": receiver})
+    lines = pd.read_csv("mean.txt", sep=" ", header=None,
+                        names=["role", "value"])
+    valid = lines.role.isin(("sender", "receiver"))
+    for line in lines[~valid].itertuples(index=False):
+        print(" ".join(map(str, line)), ": Invalid Format")
+
+    columns = {}
+    for role in ("sender", "receiver"):
+        values = lines.value[lines.role == role]
+        columns[role] = values.astype(float).reset_index(drop=True)
+    data = pd.DataFrame(columns)
     return data
 
 def get_all():
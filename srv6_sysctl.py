@@ -0,0 +1,22 @@
+"""Kernel settings shared by the post_build of the SRv6 experiments"""
+from concurrent.futures import ThreadPoolExecutor
+
+from ipmininet.utils import realIntfList
+
+
+def seg6_settings(n):
+    """Return the sysctl settings that accept SRv6 packets on all the
+    interfaces of a node"""
+    return ["net.ipv6.conf.%s.seg6_enabled=1" % intf
+            for intf in ("all", "default", *(i.name for i in realIntfList(n)))]
+
+
+def enable_seg6(net):
+    """Apply the SRv6 settings to every host and router of the network, with
+    a single sysctl call per node"""
+    def apply(n):
+        n.cmd("sysctl -q -e -w " + " ".join(seg6_settings(n)))
+
+    # Each node has its own shell, so they are configured concurrently
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(apply, net.hosts + net.routers))